@@ -19,6 +19,11 @@ cd services/admin_service
 pytest ./tests/unit -v
 cd ../..
 
+echo "Submission Service Unit Tests..."
+cd services/submission_service
+pytest ./tests/unit -v
+cd ../..
+
 echo "Compiler Service Unit Tests..."
 cd services/compiler_service
 pytest ./tests/unit -v
@@ -1,6 +1,8 @@
 from flask import Flask, request, jsonify
 import requests
 import os
+import hashlib
+import json
 from flasgger import Swagger, swag_from
 
 app = Flask(__name__)
@@ -44,6 +46,9 @@ problems = {}
 contests = {}
 admins = ['admin']
 
+# Чекеры, которые умеет compiler_service
+CHECKER_TYPES = ('exact', 'tokens', 'float', 'unordered_lines', 'custom')
+
 def verify_token(token):
     try:
         response = requests.post(
@@ -59,6 +64,77 @@ def verify_token(token):
 def is_admin(user_id):
     return user_id in admins
 
+def validate_checker(checker):
+    """Проверка описания чекера задачи. Возвращает текст ошибки или None"""
+    if checker is None:
+        return None
+    if not isinstance(checker, dict) or checker.get('type') not in CHECKER_TYPES:
+        return f'checker.type должен быть одним из: {", ".join(CHECKER_TYPES)}'
+    if checker['type'] == 'float' and not isinstance(checker.get('epsilon', 1e-6), (int, float)):
+        return 'checker.epsilon должен быть числом'
+    if checker['type'] == 'custom' and not checker.get('source'):
+        return 'Для пользовательского чекера нужен checker.source с функцией check'
+    return None
+
+def validate_test_groups(test_groups, test_count):
+    """
+    Проверка групп тестов (подзадач): [{'id', 'points', 'tests', 'depends_on'}],
+    где tests - номера тестов с 1, depends_on - id групп, которые должны быть
+    пройдены. Возвращает текст ошибки или None
+    """
+    if test_groups is None:
+        return None
+    if not isinstance(test_groups, list):
+        return 'test_groups должен быть списком'
+    ids = set()
+    seen_tests = set()
+    for group in test_groups:
+        if not isinstance(group, dict) or 'id' not in group:
+            return 'У каждой группы должен быть id'
+        if group['id'] in ids:
+            return f'Повторяющийся id группы: {group["id"]}'
+        ids.add(group['id'])
+        points = group.get('points', 0)
+        if not isinstance(points, (int, float)) or isinstance(points, bool) or points < 0:
+            return f'Группа {group["id"]}: points должен быть неотрицательным числом'
+        tests = group.get('tests', [])
+        if not isinstance(tests, list) or not all(isinstance(n, int) and 1 <= n <= test_count for n in tests):
+            return f'Группа {group["id"]}: tests - номера тестов от 1 до {test_count}'
+        if not tests:
+            return f'Группа {group["id"]}: нет тестов'
+        if seen_tests & set(tests):
+            return f'Группа {group["id"]}: тест входит в несколько групп'
+        seen_tests.update(tests)
+    
+    dependencies = {group['id']: group.get('depends_on', []) for group in test_groups}
+    for group_id, depends_on in dependencies.items():
+        if not isinstance(depends_on, list) or any(d not in ids for d in depends_on):
+            return f'Группа {group_id}: depends_on должен ссылаться на существующие группы'
+    
+    # Зависимости не должны образовывать цикл
+    resolved = set()
+    while len(resolved) < len(ids):
+        ready = [g for g, deps in dependencies.items() if g not in resolved and all(d in resolved for d in deps)]
+        if not ready:
+            return 'Зависимости групп образуют цикл'
+        resolved.update(ready)
+    return None
+
+def problem_etag(problem):
+    """
+    ETag задачи - хэш ее содержимого. В отличие от счетчика версий, он не
+    повторяется после пересоздания задачи или перезапуска сервиса
+    """
+    payload = json.dumps(problem, sort_keys=True, ensure_ascii=False)
+    return f'"{hashlib.sha256(payload.encode()).hexdigest()}"'
+
+def etag_matches(etag, if_none_match):
+    """Совпадает ли ETag с одним из перечисленных в If-None-Match (включая *)"""
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    # Для If-None-Match сравнение слабое: префикс W/ не учитывается
+    tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+    return '*' in tags or etag in tags
+
 @app.route('/health', methods=['GET'])
 @swag_from({
     'tags': ['Health'],
@@ -91,7 +167,12 @@ def get_problem(problem_id):
     if problem_id not in problems:
         return jsonify({'message': 'Задача не найдена'}), 404
     
-    return jsonify(problems[problem_id]), 200
+    # Условный запрос: compiler_service перепроверяет закэшированную задачу по ETag
+    etag = problem_etag(problems[problem_id])
+    if etag_matches(etag, request.headers.get('If-None-Match', '')):
+        return '', 304, {'ETag': etag}
+    
+    return jsonify(problems[problem_id]), 200, {'ETag': etag}
 
 @app.route('/problems', methods=['POST'])
 @swag_from({
@@ -111,11 +192,35 @@ def get_problem(problem_id):
                 'difficulty': {'type': 'string', 'enum': ['easy', 'medium', 'hard']},
                 'test_cases': {'type': 'array', 'items': {'type': 'object'}},
                 'time_limit': {'type': 'integer'},
-                'memory_limit': {'type': 'integer'}
+                'memory_limit': {'type': 'integer'},
+                'test_groups': {
+                    'type': 'array',
+                    'description': 'Группы тестов (подзадачи). Группа оценивается, только если '
+                                   'пройдены все группы из depends_on',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'id': {'type': 'integer'},
+                            'points': {'type': 'number'},
+                            'tests': {'type': 'array', 'items': {'type': 'integer'}, 'description': 'Номера тестов с 1'},
+                            'depends_on': {'type': 'array', 'items': {'type': 'integer'}}
+                        }
+                    }
+                },
+                'checker': {
+                    'type': 'object',
+                    'description': 'Чекер ответа (по умолчанию exact). '
+                                   'custom - Python-код с функцией check(input_data, expected_output, actual_output)',
+                    'properties': {
+                        'type': {'type': 'string', 'enum': list(CHECKER_TYPES)},
+                        'epsilon': {'type': 'number', 'description': 'Точность для float'},
+                        'source': {'type': 'string', 'description': 'Код пользовательского чекера'}
+                    }
+                }
             }
         }
     }],
-    'responses': {201: {'description': 'Задача создана'}, 403: {'description': 'Требуются права администратора'}}
+    'responses': {201: {'description': 'Задача создана'}, 400: {'description': 'Некорректный чекер или группы тестов'}, 403: {'description': 'Требуются права администратора'}}
 })
 def create_problem():
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
@@ -124,6 +229,13 @@ def create_problem():
         return jsonify({'message': 'Требуются права администратора'}), 403
     
     data = request.get_json()
+    checker_error = validate_checker(data.get('checker'))
+    if checker_error:
+        return jsonify({'message': checker_error}), 400
+    groups_error = validate_test_groups(data.get('test_groups'), len(data.get('test_cases', [])))
+    if groups_error:
+        return jsonify({'message': groups_error}), 400
+    
     problem_id = data.get('problem_id') or f"problem_{len(problems) + 1}"
     
     problems[problem_id] = {
@@ -134,6 +246,9 @@ def create_problem():
         'test_cases': data.get('test_cases', []),
         'time_limit': data.get('time_limit', 1),
         'memory_limit': data.get('memory_limit', 256),
+        'checker': data.get('checker') or {'type': 'exact'},
+        'test_groups': data.get('test_groups'),
+        'version': 1,
         'created_by': user_id
     }
     
@@ -150,9 +265,19 @@ def update_problem(problem_id):
         return jsonify({'message': 'Задача не найдена'}), 404
     
     data = request.get_json()
+    checker_error = validate_checker(data.get('checker'))
+    if checker_error:
+        return jsonify({'message': checker_error}), 400
+    updated = dict(problems[problem_id], **data)
+    groups_error = validate_test_groups(updated.get('test_groups'), len(updated.get('test_cases', [])))
+    if groups_error:
+        return jsonify({'message': groups_error}), 400
+    
+    version = problems[problem_id].get('version', 1)
     problems[problem_id].update(data)
+    problems[problem_id]['version'] = version + 1
     
-    return jsonify(problems[problem_id]), 200
+    return jsonify(problems[problem_id]), 200, {'ETag': problem_etag(problems[problem_id])}
 
 @app.route('/contests', methods=['GET'])
 def get_contests():
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from app import app, problems, contests, admins, is_admin
+from app import app, problems, contests, admins, is_admin, validate_checker, validate_test_groups
 
 @pytest.fixture
 def client():
@@ -139,3 +139,104 @@ def test_create_problem_authorized(client, mock_auth_verify):
     assert data['title'] == 'Test Problem'
 
 
+
+def test_get_problem_etag_and_not_modified(client, mock_auth_verify):
+    """Тест ETag задачи и ответа 304 на условный запрос"""
+    mock_auth_verify.return_value = 'admin'
+    client.post('/problems',
+        headers={'Authorization': 'Bearer token'},
+        json={'problem_id': 'problem_1', 'title': 'Test', 'description': 'Test'})
+    
+    response = client.get('/problems/problem_1', headers={'Authorization': 'Bearer token'})
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    
+    response = client.get('/problems/problem_1',
+        headers={'Authorization': 'Bearer token', 'If-None-Match': etag})
+    assert response.status_code == 304
+
+def test_update_problem_changes_etag(client, mock_auth_verify):
+    """Тест: обновление задачи меняет версию и ETag"""
+    mock_auth_verify.return_value = 'admin'
+    created = client.post('/problems',
+        headers={'Authorization': 'Bearer token'},
+        json={'problem_id': 'problem_1', 'title': 'Test', 'description': 'Test'})
+    old_etag = client.get('/problems/problem_1', headers={'Authorization': 'Bearer token'}).headers['ETag']
+    
+    response = client.put('/problems/problem_1',
+        headers={'Authorization': 'Bearer token'},
+        json={'test_cases': [{'input': '1', 'output': '1'}]})
+    
+    assert created.get_json()['version'] == 1
+    assert response.get_json()['version'] == 2
+    assert response.headers['ETag'] != old_etag
+    response = client.get('/problems/problem_1',
+        headers={'Authorization': 'Bearer token', 'If-None-Match': old_etag})
+    assert response.status_code == 200
+
+def test_recreated_problem_gets_new_etag(client, mock_auth_verify):
+    """Тест: пересозданная задача с другими тестами не отвечает 304 на старый ETag"""
+    mock_auth_verify.return_value = 'admin'
+    headers = {'Authorization': 'Bearer token'}
+    client.post('/problems', headers=headers,
+        json={'problem_id': 'p', 'test_cases': [{'input': '1', 'output': '1'}]})
+    old_etag = client.get('/problems/p', headers=headers).headers['ETag']
+    
+    client.post('/problems', headers=headers,
+        json={'problem_id': 'p', 'test_cases': [{'input': '2', 'output': '2'}]})
+    
+    response = client.get('/problems/p', headers=dict(headers, **{'If-None-Match': old_etag}))
+    assert response.status_code == 200
+    new_etag = response.headers['ETag']
+    assert new_etag != old_etag
+    for header in (f'{old_etag}, {new_etag}', f'W/{new_etag}', '*'):
+        response = client.get('/problems/p', headers=dict(headers, **{'If-None-Match': header}))
+        assert response.status_code == 304
+
+def test_validate_checker():
+    """Тест проверки описания чекера задачи"""
+    assert validate_checker(None) is None
+    assert validate_checker({'type': 'float', 'epsilon': 0.001}) is None
+    assert validate_checker({'type': 'custom', 'source': 'def check(i, e, a):\n    return True'}) is None
+    assert validate_checker({'type': 'custom'}) is not None
+    assert validate_checker({'type': 'regex'}) is not None
+
+def test_create_problem_with_invalid_checker(client, mock_auth_verify):
+    """Тест: задача с неизвестным чекером не создается"""
+    mock_auth_verify.return_value = 'admin'
+    response = client.post('/problems',
+        headers={'Authorization': 'Bearer token'},
+        json={'title': 'Test', 'description': 'Test', 'checker': {'type': 'regex'}})
+    assert response.status_code == 400
+
+def test_validate_test_groups():
+    """Тест проверки групп тестов и их зависимостей"""
+    groups = [
+        {'id': 1, 'points': 20, 'tests': [1, 2]},
+        {'id': 2, 'points': 30, 'tests': [3]},
+        {'id': 3, 'points': 50, 'tests': [4], 'depends_on': [1, 2]}
+    ]
+    assert validate_test_groups(None, 0) is None
+    assert validate_test_groups(groups, 4) is None
+    assert validate_test_groups(groups, 3) is not None
+    assert validate_test_groups([{'id': 1, 'tests': [1]}, {'id': 2, 'tests': [1]}], 1) is not None
+    assert validate_test_groups([{'id': 1, 'tests': [1], 'depends_on': [5]}], 1) is not None
+    assert validate_test_groups([{'id': 1, 'tests': [1], 'depends_on': [2]},
+                                 {'id': 2, 'tests': [2], 'depends_on': [1]}], 2) is not None
+    assert validate_test_groups([{'id': 1, 'tests': [1], 'points': -1}], 1) is not None
+    assert validate_test_groups([{'id': 1, 'points': 10, 'tests': []}], 1) is not None
+
+def test_update_problem_validates_test_groups(client, mock_auth_verify):
+    """Тест: группы тестов проверяются против тестов задачи и при обновлении"""
+    mock_auth_verify.return_value = 'admin'
+    created = client.post('/problems',
+        headers={'Authorization': 'Bearer token'},
+        json={'problem_id': 'problem_1', 'title': 'Test', 'description': 'Test',
+              'test_cases': [{'input': '1', 'output': '1'}],
+              'test_groups': [{'id': 1, 'points': 100, 'tests': [1]}]})
+    assert created.status_code == 201
+    
+    response = client.put('/problems/problem_1',
+        headers={'Authorization': 'Bearer token'},
+        json={'test_cases': []})
+    assert response.status_code == 400
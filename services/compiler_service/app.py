@@ -1,15 +1,120 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import requests
 import os
+import sys
+import json
+import hashlib
+import queue
+import signal
+import socket
+import atexit
+import selectors
+import math
 import subprocess
+import py_compile
 import tempfile
 import shutil
+import threading
+import uuid
+from array import array
+from collections import OrderedDict, Counter
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from flasgger import Swagger, swag_from
+from prometheus_client import Counter as MetricCounter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
 
 app = Flask(__name__)
 
 ADMIN_SERVICE_URL = os.getenv('ADMIN_SERVICE_URL', 'http://admin_service:5003')
 
+# Настройки параллельного запуска тестов
+# JUDGE_EXECUTOR: 'thread' (по умолчанию) или 'process'
+JUDGE_EXECUTOR = os.getenv('JUDGE_EXECUTOR', 'thread')
+# Общий размер пула воркеров на весь сервис
+JUDGE_WORKERS = int(os.getenv('JUDGE_WORKERS', str(os.cpu_count() or 2)))
+# Сколько тестов одного сабмишена может выполняться одновременно
+JUDGE_MAX_PARALLEL_PER_SUBMISSION = int(os.getenv('JUDGE_MAX_PARALLEL_PER_SUBMISSION', '4'))
+
+# Ограничения по умолчанию, если у задачи не заданы time_limit/memory_limit
+JUDGE_DEFAULT_TIME_LIMIT = float(os.getenv('JUDGE_DEFAULT_TIME_LIMIT', '5'))
+JUDGE_DEFAULT_MEMORY_LIMIT = int(os.getenv('JUDGE_DEFAULT_MEMORY_LIMIT', '256'))
+# Ограничение по реальному времени = time_limit * JUDGE_WALL_TIME_FACTOR
+# (защита от программ, которые спят или ждут ввода, не тратя CPU)
+JUDGE_WALL_TIME_FACTOR = float(os.getenv('JUDGE_WALL_TIME_FACTOR', '2'))
+
+# Кэш задач: максимальное число задач и время (сек), после которого задача
+# перепроверяется в admin_service условным запросом по ETag
+PROBLEM_CACHE_SIZE = int(os.getenv('PROBLEM_CACHE_SIZE', '1000'))
+PROBLEM_CACHE_TTL = float(os.getenv('PROBLEM_CACHE_TTL', '30'))
+
+# Асинхронные задания на проверку: размер очереди, число одновременно
+# проверяемых заданий и сколько завершенных заданий хранить
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '100'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', '1000'))
+
+# Пакетная проверка (/compile/batch): максимум сабмишенов в запросе и сколько
+# сабмишенов пакета проверяется одновременно (их тесты делят общий пул)
+BATCH_MAX_SUBMISSIONS = int(os.getenv('BATCH_MAX_SUBMISSIONS', '10000'))
+BATCH_CONCURRENCY = int(os.getenv(
+    'BATCH_CONCURRENCY', str(max(2, JUDGE_WORKERS // max(1, JUDGE_MAX_PARALLEL_PER_SUBMISSION) * 2))
+))
+
+# Сколько скомпилированных пользовательских чекеров держать в памяти
+CHECKER_CACHE_SIZE = int(os.getenv('CHECKER_CACHE_SIZE', '64'))
+# Каталог скомпилированных чекеров (имя - sha256 исходника) и ограничения на
+# один вызов чекера (секунды CPU и мегабайты)
+CHECKER_DIR = os.getenv('CHECKER_DIR', os.path.join(tempfile.gettempdir(), 'judge_checkers'))
+CHECKER_TIME_LIMIT = float(os.getenv('CHECKER_TIME_LIMIT', '5'))
+CHECKER_MEMORY_LIMIT = int(os.getenv('CHECKER_MEMORY_LIMIT', '256'))
+# Точность по умолчанию для чекера float
+DEFAULT_FLOAT_EPSILON = 1e-6
+
+# Размер кэша вердиктов (0 - кэш выключен)
+VERDICT_CACHE_SIZE = int(os.getenv('VERDICT_CACHE_SIZE', '1024'))
+
+# Максимальный размер исходника в байтах
+JUDGE_MAX_SOURCE_SIZE = int(os.getenv('JUDGE_MAX_SOURCE_SIZE', str(64 * 1024)))
+# Проверка синтаксиса для задач без тестов: размер кэша результатов и
+# ограничения на саму проверку (секунды CPU и мегабайты)
+SYNTAX_CACHE_SIZE = int(os.getenv('SYNTAX_CACHE_SIZE', '4096'))
+SYNTAX_CHECK_TIME_LIMIT = float(os.getenv('SYNTAX_CHECK_TIME_LIMIT', '2'))
+SYNTAX_CHECK_MEMORY_LIMIT = int(os.getenv('SYNTAX_CHECK_MEMORY_LIMIT', '256'))
+
+# Лимит вывода программы в байтах (превышение - вердикт OLE), сколько stderr
+# хранить для ответа и сколько вывода показывать в details при WA
+JUDGE_OUTPUT_LIMIT = int(os.getenv('JUDGE_OUTPUT_LIMIT', str(16 * 1024 * 1024)))
+JUDGE_STDERR_LIMIT = int(os.getenv('JUDGE_STDERR_LIMIT', str(64 * 1024)))
+JUDGE_OUTPUT_PREVIEW = int(os.getenv('JUDGE_OUTPUT_PREVIEW', '1024'))
+
+# Пул прогретых интерпретаторов (JUDGE_WARM_POOL=0 - новый интерпретатор на каждый тест)
+JUDGE_WARM_POOL = os.getenv('JUDGE_WARM_POOL', '1') == '1'
+# Модули, которые заранее импортируются в шаблонном интерпретаторе
+JUDGE_PRELOAD_MODULES = os.getenv(
+    'JUDGE_PRELOAD_MODULES',
+    'math,re,string,random,collections,itertools,functools,heapq,bisect,decimal,fractions,statistics,array'
+)
+
+# Компилируемые языки: компиляторы и ограничение на время компиляции (сек)
+JUDGE_CC = os.getenv('JUDGE_CC', 'gcc')
+JUDGE_CXX = os.getenv('JUDGE_CXX', 'g++')
+JUDGE_COMPILE_TIMEOUT = float(os.getenv('JUDGE_COMPILE_TIMEOUT', '30'))
+# Кэш собранных программ на диске: каталог и максимальное число бинарников
+BUILD_CACHE_DIR = os.getenv('BUILD_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'judge_builds'))
+BUILD_CACHE_SIZE = int(os.getenv('BUILD_CACHE_SIZE', '256'))
+# Входные данные тестов на диске (имя - sha256 содержимого): каталог и лимит общего размера в байтах
+TEST_INPUT_DIR = os.getenv('TEST_INPUT_DIR', os.path.join(tempfile.gettempdir(), 'judge_inputs'))
+TEST_INPUT_CACHE_BYTES = int(os.getenv('TEST_INPUT_CACHE_BYTES', str(1024 * 1024 * 1024)))
+
+# История времени тестов для планирования (самые долгие тесты - первыми):
+# файл, период сохранения (сек), вес нового замера в скользящем среднем и
+# сколько задач хранить
+RUNTIME_STATS_PATH = os.getenv('RUNTIME_STATS_PATH', os.path.join(tempfile.gettempdir(), 'judge_runtime_stats.json'))
+RUNTIME_STATS_SAVE_INTERVAL = float(os.getenv('RUNTIME_STATS_SAVE_INTERVAL', '60'))
+RUNTIME_STATS_ALPHA = float(os.getenv('RUNTIME_STATS_ALPHA', '0.3'))
+RUNTIME_STATS_MAX_PROBLEMS = int(os.getenv('RUNTIME_STATS_MAX_PROBLEMS', '10000'))
+
 # Настройка Swagger
 swagger_config = {
     "headers": [],
@@ -35,50 +140,1710 @@ swagger_template = {
 
 swagger = Swagger(app, config=swagger_config, template=swagger_template)
 
-# Простая база данных в памяти для тест-кейсов
-test_cases_cache = {}
+# Prometheus метрики
+http_requests_total = MetricCounter(
+    'http_requests_total',
+    'Total HTTP requests',
+    ['service', 'method', 'endpoint', 'status']
+)
 
-def get_problem_test_cases(problem_id):
-    if problem_id in test_cases_cache:
-        return test_cases_cache[problem_id]
+http_request_duration_seconds = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request duration in seconds',
+    ['service', 'method', 'endpoint']
+)
+
+judge_queue_wait_seconds = Histogram(
+    'judge_queue_wait_seconds',
+    'Time spent waiting in a queue before judging starts',
+    ['queue'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+judge_test_run_seconds = Histogram(
+    'judge_test_run_seconds',
+    'Wall time of a single test run',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+judge_sandbox_startup_seconds = Histogram(
+    'judge_sandbox_startup_seconds',
+    'Time from a run request until the sandboxed process is started',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+)
+
+judge_comparison_seconds = Histogram(
+    'judge_comparison_seconds',
+    'Time spent comparing program output with the expected output',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+
+judge_verdicts_total = MetricCounter(
+    'judge_verdicts_total',
+    'Judged tests by verdict',
+    ['verdict']
+)
+
+judge_tests_in_flight = Gauge(
+    'judge_tests_in_flight',
+    'Tests currently running'
+)
+
+judge_pool_utilization = Gauge(
+    'judge_pool_utilization',
+    'Share of busy interpreters in the warm pool (0-1)'
+)
+
+judge_job_queue_size = Gauge(
+    'judge_job_queue_size',
+    'Jobs waiting in the judge queue'
+)
+
+judge_cache_hit_ratio = Gauge(
+    'judge_cache_hit_ratio',
+    'Cache hit ratio since start',
+    ['cache']
+)
+
+@app.before_request
+def before_request():
+    request.start_time = time.time()
+
+@app.after_request
+def after_request(response):
+    duration = time.time() - request.start_time
+    endpoint = request.endpoint or 'unknown'
     
+    http_requests_total.labels(
+        service='compiler_service',
+        method=request.method,
+        endpoint=endpoint,
+        status=response.status_code
+    ).inc()
+    
+    http_request_duration_seconds.labels(
+        service='compiler_service',
+        method=request.method,
+        endpoint=endpoint
+    ).observe(duration)
+    
+    return response
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с ограничением по числу записей и счетчиками попаданий"""
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+    
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0
+            }
+
+# Кэш задач (тест-кейсы и ограничения): problem_id -> {'problem', 'etag', 'checked_at'}
+problems_cache = LRUCache(PROBLEM_CACHE_SIZE)
+
+def get_problem(problem_id):
+    """
+    Задача из кэша. Если запись старше PROBLEM_CACHE_TTL, она перепроверяется
+    в admin_service с If-None-Match: на 304 продлевается, на 200 заменяется.
+    Если admin_service недоступен, отдается последняя известная версия.
+    """
+    entry = problems_cache.get(problem_id)
+    now = time.monotonic()
+    if entry is not None and now - entry['checked_at'] < PROBLEM_CACHE_TTL:
+        return entry['problem']
+    
+    headers = {}
+    if entry is not None and entry['etag']:
+        headers['If-None-Match'] = entry['etag']
     try:
-        response = requests.get(f'{ADMIN_SERVICE_URL}/problems/{problem_id}')
+        response = requests.get(f'{ADMIN_SERVICE_URL}/problems/{problem_id}', headers=headers)
+        if response.status_code == 304 and entry is not None:
+            problems_cache.set(problem_id, dict(entry, checked_at=now))
+            return entry['problem']
         if response.status_code == 200:
             problem = response.json()
-            test_cases = problem.get('test_cases', [])
-            test_cases_cache[problem_id] = test_cases
-            return test_cases
+            problems_cache.set(problem_id, {
+                'problem': problem,
+                'etag': response.headers.get('ETag'),
+                'checked_at': now
+            })
+            return problem
+        if response.status_code == 404:
+            problems_cache.pop(problem_id)
+            return None
     except:
         pass
     
-    return []
+    return entry['problem'] if entry is not None else None
+
+def invalidate_problem(problem_id):
+    """Удаление задачи из кэша - при следующем запросе тесты загрузятся заново"""
+    return problems_cache.pop(problem_id) is not None
+
+def get_problem_test_cases(problem_id):
+    problem = get_problem(problem_id)
+    return problem.get('test_cases', []) if problem else []
+
+def get_test_set_version(problem):
+    """
+    Версия набора тестов задачи - хэш всего, что влияет на вердикт
+    (тест-кейсы, ограничения и чекер). Считается один раз на закэшированную задачу.
+    """
+    if not problem:
+        return None
+    if '_test_set_version' not in problem:
+        payload = json.dumps({
+            'test_cases': problem.get('test_cases', []),
+            'limits': get_problem_limits(problem),
+            'checker': problem.get('checker'),
+            'test_groups': problem.get('test_groups')
+        }, sort_keys=True)
+        problem['_test_set_version'] = hashlib.sha256(payload.encode()).hexdigest()
+    return problem['_test_set_version']
+
+def input_digest(input_data):
+    return hashlib.sha256(input_data.encode()).hexdigest()
+
+def get_test_input_digests(problem):
+    """Хэши входных данных тестов задачи (ключи test_input_store). Считаются один раз на закэшированную задачу"""
+    if not problem:
+        return None
+    if '_input_digests' not in problem:
+        problem['_input_digests'] = [input_digest(t.get('input', '')) for t in problem.get('test_cases', [])]
+    return problem['_input_digests']
+
+def get_problem_limits(problem):
+    """Ограничения задачи: time_limit в секундах CPU, memory_limit в мегабайтах"""
+    problem = problem or {}
+    return {
+        'time_limit': float(problem.get('time_limit') or JUDGE_DEFAULT_TIME_LIMIT),
+        'memory_limit': int(problem.get('memory_limit') or JUDGE_DEFAULT_MEMORY_LIMIT)
+    }
 
-def run_python_code(code, input_data):
+# Исходник шаблонного интерпретатора (в стиле forkserver).
+# Шаблон один раз стартует, импортирует модули из JUDGE_PRELOAD_MODULES и
+# дальше на каждый запрос делает fork. Дочерний процесс получает stdin/stdout/stderr
+# через сокет, выполняет код участника и завершается, шаблон остается чистым.
+_WARM_TEMPLATE_SOURCE = r"""
+import os, sys, json, socket, runpy, traceback
+
+for _name in sys.argv[2].split(','):
+    if _name:
+        try:
+            __import__(_name)
+        except ImportError:
+            pass
+
+def _exit_code(exc):
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+def _apply_limits(limits):
+    import resource
+    if limits.get('cpu'):
+        resource.setrlimit(resource.RLIMIT_CPU, (limits['cpu'], limits['cpu'] + 1))
+    if limits.get('memory'):
+        resource.setrlimit(resource.RLIMIT_AS, (limits['memory'], limits['memory']))
+
+def _run_child(request, fds):
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+    for fd in fds:
+        os.close(fd)
+    _apply_limits(request.get('limits', {}))
+    if request.get('native'):
+        try:
+            os.execv(request['path'], [request['path']])
+        except OSError as e:
+            os.write(2, f'{e}\n'.encode())
+            return 127
+    sys.stdin = open(0, 'r', closefd=False)
+    sys.stdout = open(1, 'w', closefd=False)
+    sys.stderr = open(2, 'w', closefd=False)
+    sys.argv = [request['path']]
+    # Как у python file.py: первым в sys.path каталог программы, а не рабочий каталог сервиса
+    sys.path[0] = os.path.dirname(os.path.abspath(request['path']))
+    if 'random' in sys.modules:
+        sys.modules['random'].seed()
+    code = 0
     try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
+        runpy.run_path(request['path'], run_name='__main__')
+    except SystemExit as e:
+        code = _exit_code(e)
+    except BaseException as e:
+        # Прячем кадры шаблона и runpy, как будто код запущен через python file.py
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != request['filename']:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb)
+        code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        code = code or 1
+    return code
+
+sock = socket.socket(fileno=int(sys.argv[1]))
+sys.stdout.flush()
+sys.stderr.flush()
+while True:
+    try:
+        msg, fds, _, _ = socket.recv_fds(sock, 65536, 3)
+    except OSError:
+        break
+    if not msg:
+        break
+    request = json.loads(msg)
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            sock.close()
+            os.setsid()
+            code = _run_child(request, fds)
+        finally:
+            os._exit(code)
+    for fd in fds:
+        os.close(fd)
+    sock.send(json.dumps({'pid': pid}).encode())
+    _, status, usage = os.wait4(pid, 0)
+    sock.send(json.dumps({
+        'status': status,
+        'cpu_time': usage.ru_utime + usage.ru_stime,
+        'peak_rss_kb': usage.ru_maxrss
+    }).encode())
+"""
+
+def _kill_process_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+# Как часто запуск проверяет флаг отмены (режим first_failure)
+CANCEL_POLL_INTERVAL = 0.05
+
+def _read_outputs(stdout_fd, stderr_fd, deadline, cancel_event=None, stdout_sink=None, output_limit=None):
+    """
+    Чтение stdout/stderr до EOF, дедлайна, отмены или превышения лимита вывода.
+    Куски stdout передаются в stdout_sink (без него копятся в памяти),
+    от stderr хранится не больше JUDGE_STDERR_LIMIT байт. output_limit по
+    умолчанию - JUDGE_OUTPUT_LIMIT.
+    Возвращает (stdout, stderr, stopped), где stopped - None, 'timeout',
+    'cancelled' или 'output_limit'
+    """
+    if output_limit is None:
+        output_limit = JUDGE_OUTPUT_LIMIT
+    stdout_chunks = []
+    stderr_chunks = []
+    stdout_size = 0
+    stderr_size = 0
+    if stdout_sink is None:
+        stdout_sink = stdout_chunks.append
+    
+    def outputs(stopped):
+        return b''.join(stdout_chunks), b''.join(stderr_chunks), stopped
+    
+    with selectors.DefaultSelector() as selector:
+        selector.register(stdout_fd, selectors.EVENT_READ)
+        selector.register(stderr_fd, selectors.EVENT_READ)
+        while selector.get_map():
+            if cancel_event is not None and cancel_event.is_set():
+                return outputs('cancelled')
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return outputs('timeout')
+            if cancel_event is not None:
+                remaining = min(remaining, CANCEL_POLL_INTERVAL)
+            for key, _ in selector.select(remaining):
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fd)
+                elif key.fd == stdout_fd:
+                    stdout_size += len(data)
+                    if stdout_size > output_limit:
+                        return outputs('output_limit')
+                    stdout_sink(data)
+                elif stderr_size < JUDGE_STDERR_LIMIT:
+                    data = data[:JUDGE_STDERR_LIMIT - stderr_size]
+                    stderr_size += len(data)
+                    stderr_chunks.append(data)
+    return outputs(None)
+
+# Пробельные символы для сравнения вывода (как у str.strip для ASCII)
+_WHITESPACE = b' \t\n\r\x0b\x0c'
+
+class Comparator:
+    """
+    Базовый потоковый чекер: вывод подается кусками через feed, итог - finish().
+    В preview сохраняется начало вывода для details, в message - комментарий чекера.
+    """
+    
+    def __init__(self, expected_output, preview_limit=JUDGE_OUTPUT_PREVIEW):
+        self.preview_limit = preview_limit
+        self._preview = bytearray()
+        self.truncated = False
+        self.message = None
+        self.elapsed = 0.0  # время сравнения в feed, для метрик
+    
+    def feed(self, chunk):
+        started = time.perf_counter()
+        if len(self._preview) < self.preview_limit:
+            self._preview += chunk[:self.preview_limit - len(self._preview)]
+        if len(self._preview) >= self.preview_limit:
+            self.truncated = True
+        self._consume(chunk)
+        self.elapsed += time.perf_counter() - started
+    
+    def _consume(self, chunk):
+        raise NotImplementedError
+    
+    def finish(self):
+        raise NotImplementedError
+    
+    @property
+    def preview(self):
+        return bytes(self._preview).decode(errors='replace').strip()
+
+class OutputComparator(Comparator):
+    """
+    Чекер exact: сравнение, эквивалентное actual.strip() == expected.strip(),
+    без хранения всего вывода.
+    """
+    
+    def __init__(self, expected_output, preview_limit=JUDGE_OUTPUT_PREVIEW):
+        super().__init__(expected_output, preview_limit)
+        self.expected = expected_output.strip().encode()
+        self._pos = 0            # сколько байт ответа уже совпало
+        self._started = False    # пропущены ли ведущие пробелы
+        self._tail = False       # дальше допустимы только пробельные символы
+        self._mismatch = False
+    
+    def _consume(self, chunk):
+        if self._mismatch:
+            return
+        
+        data = chunk
+        if not self._started:
+            data = data.lstrip(_WHITESPACE)
+            if not data:
+                return
+            self._started = True
+        
+        if not self._tail:
+            expected_rest = self.expected[self._pos:self._pos + len(data)]
+            matched = len(expected_rest)
+            if data[:matched] != expected_rest:
+                matched = next(i for i in range(matched) if data[i] != expected_rest[i])
+            self._pos += matched
+            data = data[matched:]
+            if data:
+                # Ответ закончился или расхождение: дальше могут быть только пробелы
+                self._tail = True
         
+        if self._tail and data.translate(None, _WHITESPACE):
+            self._mismatch = True
+    
+    def finish(self):
+        return not self._mismatch and self._pos == len(self.expected)
+
+class TokenComparator(Comparator):
+    """Чекер tokens: последовательности токенов через любые пробельные символы совпадают"""
+    
+    def __init__(self, expected_output, preview_limit=JUDGE_OUTPUT_PREVIEW):
+        super().__init__(expected_output, preview_limit)
+        self.expected = expected_output.encode().split()
+        # Токен длиннее любого ожидаемого (с запасом) уже не совпадет - не копим его
+        self._max_token = max((len(token) for token in self.expected), default=0) + 64
+        self._index = 0
+        self._partial = b''
+        self._mismatch = False
+    
+    def tokens_equal(self, expected, actual):
+        return expected == actual
+    
+    def _check(self, token):
+        if self._index >= len(self.expected) or not self.tokens_equal(self.expected[self._index], token):
+            self._mismatch = True
+            self.message = f'Расхождение в токене {self._index + 1}'
+        self._index += 1
+    
+    def _consume(self, chunk):
+        if self._mismatch:
+            return
+        data = self._partial + chunk
+        tokens = data.split()
+        # Последний токен может продолжиться в следующем куске
+        self._partial = tokens.pop() if tokens and not data[-1:].isspace() else b''
+        for token in tokens:
+            self._check(token)
+            if self._mismatch:
+                return
+        if len(self._partial) > self._max_token:
+            self._mismatch = True
+    
+    def finish(self):
+        if self._partial and not self._mismatch:
+            self._check(self._partial)
+            self._partial = b''
+        if not self._mismatch and self._index != len(self.expected):
+            self.message = f'Ожидалось токенов: {len(self.expected)}, получено: {self._index}'
+            return False
+        return not self._mismatch
+
+class FloatComparator(TokenComparator):
+    """
+    Чекер float: токены-числа сравниваются с абсолютной или относительной
+    погрешностью epsilon, остальные токены - точно
+    """
+    
+    def __init__(self, expected_output, epsilon=DEFAULT_FLOAT_EPSILON, preview_limit=JUDGE_OUTPUT_PREVIEW):
+        super().__init__(expected_output, preview_limit)
+        self.epsilon = epsilon
+    
+    def tokens_equal(self, expected, actual):
         try:
-            result = subprocess.run(
-                ['python', temp_file],
-                input=input_data,
-                capture_output=True,
-                text=True,
-                timeout=5
+            expected_value = float(expected)
+            actual_value = float(actual)
+        except ValueError:
+            return expected == actual
+        if not (math.isfinite(expected_value) and math.isfinite(actual_value)):
+            return expected == actual
+        difference = abs(expected_value - actual_value)
+        return difference <= self.epsilon or difference <= self.epsilon * abs(expected_value)
+
+class UnorderedLinesComparator(Comparator):
+    """Чекер unordered_lines: непустые строки (без пробелов по краям) совпадают как мультимножества"""
+    
+    def __init__(self, expected_output, preview_limit=JUDGE_OUTPUT_PREVIEW):
+        super().__init__(expected_output, preview_limit)
+        self._remaining = Counter(
+            line.strip() for line in expected_output.encode().splitlines() if line.strip()
+        )
+        self._partial = b''
+        self._mismatch = False
+    
+    def _take(self, line):
+        line = line.strip()
+        if not line:
+            return
+        if self._remaining[line] <= 0:
+            self._mismatch = True
+            self.message = 'Лишняя строка в выводе'
+            return
+        self._remaining[line] -= 1
+    
+    def _consume(self, chunk):
+        if self._mismatch:
+            return
+        lines = (self._partial + chunk).split(b'\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._take(line)
+    
+    def finish(self):
+        if not self._mismatch:
+            self._take(self._partial)
+        if not self._mismatch and any(self._remaining.values()):
+            self.message = 'В выводе не хватает строк'
+            return False
+        return not self._mismatch
+
+class CheckerError(Exception):
+    """Ошибка в пользовательском чекере задачи (вердикт CF)"""
+
+# Скомпилированные пользовательские чекеры: sha256 исходника -> путь к .pyc
+checker_cache = LRUCache(CHECKER_CACHE_SIZE)
+
+# Дописывается к исходнику чекера: вход, ответ и вывод приходят JSON на stdin,
+# результат - JSON последней строкой stdout
+_CHECKER_FOOTER = r"""
+
+import json as _json, sys as _sys
+_data = _json.loads(_sys.stdin.buffer.read())
+if not callable(globals().get('check')):
+    _reply = {'error': 'В чекере нет функции check'}
+else:
+    _verdict, _message = check(_data['input'], _data['expected'], _data['actual']), None
+    if isinstance(_verdict, tuple):
+        _verdict, _message = _verdict
+    _reply = {'ok': bool(_verdict), 'message': None if _message is None else str(_message)}
+print()
+print(_json.dumps(_reply))
+"""
+
+def stage_custom_checker(source):
+    """
+    Пользовательский чекер - Python-код от администратора задачи с функцией
+    check(input_data, expected_output, actual_output), возвращающей bool или
+    (bool, сообщение). Код компилируется в .pyc один раз на версию исходника,
+    а вызывается, как и решения, в дочернем процессе шаблонного интерпретатора
+    с ограничениями CHECKER_TIME_LIMIT и CHECKER_MEMORY_LIMIT: зависший чекер
+    дает вердикт CF и не занимает поток сервиса. Возвращает путь к .pyc.
+    """
+    key = hashlib.sha256(source.encode()).hexdigest()
+    pyc_path = checker_cache.get(key)
+    if pyc_path is not None and os.path.exists(pyc_path):
+        return pyc_path
+    
+    os.makedirs(CHECKER_DIR, exist_ok=True)
+    source_path = os.path.join(CHECKER_DIR, key + '.py')
+    pyc_path = source_path + 'c'
+    if not os.path.exists(pyc_path):
+        # Пишем во временные файлы и переименовываем: чекер могут готовить несколько потоков сразу
+        fd, tmp_source = tempfile.mkstemp(dir=CHECKER_DIR, suffix='.py')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(source + _CHECKER_FOOTER)
+            py_compile.compile(tmp_source, cfile=tmp_source + 'c', dfile='<checker>', doraise=True)
+            os.replace(tmp_source, source_path)
+            os.replace(tmp_source + 'c', pyc_path)
+        except py_compile.PyCompileError as e:
+            raise CheckerError(f'Ошибка загрузки чекера: {e.msg}')
+        finally:
+            for leftover in (tmp_source, tmp_source + 'c'):
+                if os.path.exists(leftover):
+                    os.unlink(leftover)
+    checker_cache.set(key, pyc_path)
+    return pyc_path
+
+class CustomComparator(Comparator):
+    """Пользовательский чекер: вывод накапливается (не больше лимита вывода) и передается в check"""
+    
+    def __init__(self, expected_output, input_data, source, preview_limit=JUDGE_OUTPUT_PREVIEW):
+        super().__init__(expected_output, preview_limit)
+        self.expected_output = expected_output
+        self.input_data = input_data
+        self.checker_path = stage_custom_checker(source)
+        self._chunks = []
+    
+    def _consume(self, chunk):
+        self._chunks.append(chunk)
+    
+    def finish(self):
+        actual_output = b''.join(self._chunks).decode(errors='replace')
+        payload = json.dumps({'input': self.input_data, 'expected': self.expected_output, 'actual': actual_output})
+        run_result = run_program(self.checker_path, payload, CHECKER_TIME_LIMIT, CHECKER_MEMORY_LIMIT)
+        verdict = run_verdict(run_result, {'time_limit': CHECKER_TIME_LIMIT, 'memory_limit': CHECKER_MEMORY_LIMIT})
+        if verdict == 'TLE':
+            raise CheckerError('Чекер превысил ограничение по времени')
+        if verdict == 'MLE':
+            raise CheckerError('Чекер превысил ограничение по памяти')
+        if verdict == 'IE':
+            raise CheckerError('Не удалось запустить чекер')
+        if verdict is not None:
+            stderr_lines = run_result['stderr'].strip().splitlines()
+            raise CheckerError(f"Ошибка в чекере: {stderr_lines[-1] if stderr_lines else exit_description(run_result)}")
+        try:
+            reply = json.loads(run_result['stdout'].strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            raise CheckerError('Чекер вернул некорректный ответ')
+        if 'error' in reply:
+            raise CheckerError(reply['error'])
+        self.message = reply['message']
+        return reply['ok']
+
+CHECKER_TYPES = ('exact', 'tokens', 'float', 'unordered_lines', 'custom')
+
+def make_comparator(checker, test_case):
+    """Чекер для тест-кейса по описанию checker задачи ({'type': ..., ...} или None)"""
+    checker = checker or {'type': 'exact'}
+    expected_output = test_case.get('output', '')
+    checker_type = checker.get('type', 'exact')
+    if checker_type == 'exact':
+        return OutputComparator(expected_output)
+    if checker_type == 'tokens':
+        return TokenComparator(expected_output)
+    if checker_type == 'float':
+        return FloatComparator(expected_output, float(checker.get('epsilon', DEFAULT_FLOAT_EPSILON)))
+    if checker_type == 'unordered_lines':
+        return UnorderedLinesComparator(expected_output)
+    if checker_type == 'custom':
+        return CustomComparator(expected_output, test_case.get('input', ''), checker.get('source', ''))
+    raise CheckerError(f'Неизвестный тип чекера: {checker_type}')
+
+def _rlimits(time_limit, memory_limit):
+    """Значения rlimit для запуска: CPU в целых секундах, адресное пространство в байтах"""
+    return {
+        'cpu': max(1, math.ceil(time_limit)),
+        'memory': memory_limit * 1024 * 1024 if memory_limit else None
+    }
+
+class TemplateInterpreter:
+    """
+    Шаблонный интерпретатор: запускает каждый тест в своем дочернем процессе
+    (fork), ставит ему rlimit и возвращает код возврата, CPU-время и пиковый RSS.
+    Обслуживает один запуск за раз.
+    
+    Запуск через fork шаблона, а не через subprocess, нужен еще и для честного
+    замера памяти: после fork+exec из сервиса ru_maxrss ребенка включает RSS
+    самого сервиса.
+    """
+    
+    def __init__(self, preload_modules=''):
+        self.sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            self.proc = subprocess.Popen(
+                [sys.executable, '-c', _WARM_TEMPLATE_SOURCE, str(child_sock.fileno()), preload_modules],
+                pass_fds=[child_sock.fileno()],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL
             )
+        except Exception:
+            self.sock.close()
+            raise
+        finally:
+            child_sock.close()
+    
+    def close(self):
+        self.sock.close()
+        self.proc.kill()
+        self.proc.wait()
+    
+    def _recv(self, timeout=None):
+        self.sock.settimeout(timeout)
+        try:
+            reply = self.sock.recv(65536)
+        finally:
+            self.sock.settimeout(None)
+        if not reply:
+            raise RuntimeError('Шаблонный интерпретатор завершился')
+        return json.loads(reply)
+    
+    def run(self, path, input_data, time_limit, memory_limit=None, filename=None, cancel_event=None,
+            stdout_sink=None, native=False, stdin_file=None):
+        """
+        Запуск path на input_data. Реальное время ограничено time_limit * JUDGE_WALL_TIME_FACTOR,
+        при установке cancel_event запуск прерывается. Если задан stdout_sink,
+        вывод передается в него по кускам и не попадает в результат.
+        native=True - path это собранная программа, ребенок делает exec вместо runpy.
+        stdin_file - открытый файл со входом: программа получает его дескриптор, input_data не используется.
+        """
+        request_data = json.dumps({
+            'path': path,
+            'filename': filename or path,
+            'limits': _rlimits(time_limit, memory_limit),
+            'native': native
+        }).encode()
+        started = time.monotonic()
+        deadline = started + time_limit * JUDGE_WALL_TIME_FACTOR
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        pid = None
+        try:
+            if stdin_file is not None:
+                socket.send_fds(self.sock, [request_data], [stdin_file.fileno(), stdout_w, stderr_w])
+            else:
+                with tempfile.TemporaryFile() as input_file:
+                    input_file.write(input_data.encode())
+                    input_file.seek(0)
+                    socket.send_fds(self.sock, [request_data], [input_file.fileno(), stdout_w, stderr_w])
+            os.close(stdout_w)
+            os.close(stderr_w)
+            stdout_w = stderr_w = None
+            pid = self._recv()['pid']
+            judge_sandbox_startup_seconds.observe(time.monotonic() - started)
+            
+            stdout, stderr, stopped = _read_outputs(stdout_r, stderr_r, deadline, cancel_event, stdout_sink)
+            if stopped:
+                _kill_process_group(pid)
+            # Процесс мог закрыть stdout и продолжить работу - ждем статус до дедлайна
+            try:
+                reply = self._recv(max(deadline - time.monotonic(), 0.001))
+            except socket.timeout:
+                stopped = stopped or 'timeout'
+                _kill_process_group(pid)
+                reply = self._recv()
+            wall_time = time.monotonic() - started
+        except BaseException:
+            if pid is not None:
+                _kill_process_group(pid)
+            raise
+        finally:
+            for fd in (stdout_r, stderr_r, stdout_w, stderr_w):
+                if fd is not None:
+                    os.close(fd)
+        
+        result = {
+            'stdout': stdout.decode(errors='replace'),
+            'stderr': stderr.decode(errors='replace'),
+            'returncode': os.waitstatus_to_exitcode(reply['status']),
+            'cpu_time': round(reply['cpu_time'], 3),
+            'wall_time': round(wall_time, 3),
+            'peak_rss_kb': reply['peak_rss_kb']
+        }
+        if stopped == 'cancelled':
+            result.update({'stdout': '', 'stderr': 'Cancelled', 'returncode': -1, 'cancelled': True})
+        elif stopped == 'timeout':
+            result.update({'stdout': '', 'stderr': 'Timeout', 'returncode': -1, 'timed_out': True})
+        elif stopped == 'output_limit':
+            result.update({'stdout': '', 'stderr': 'Output limit exceeded', 'returncode': -1,
+                           'output_limit_exceeded': True})
+        return result
+
+class WarmInterpreterPool:
+    """
+    Пул прогретых шаблонных интерпретаторов с заранее импортированными модулями.
+    Каждый тест выполняется в отдельном дочернем процессе шаблона, поэтому
+    изоляция между тестами такая же, как при запуске нового python.
+    """
+    
+    def __init__(self, size, preload_modules):
+        self.size = size
+        self.preload_modules = preload_modules
+        self._idle = queue.Queue()
+        self._templates = []
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(None)  # шаблоны стартуют лениво
+    
+    def _start_template(self):
+        template = TemplateInterpreter(self.preload_modules)
+        with self._lock:
+            self._templates.append(template)
+        return template
+    
+    def _discard_template(self, template):
+        template.close()
+        with self._lock:
+            if template in self._templates:
+                self._templates.remove(template)
+    
+    def run(self, path, input_data, time_limit, memory_limit=None, filename=None, cancel_event=None,
+            stdout_sink=None, native=False, stdin_file=None):
+        template = self._idle.get()
+        try:
+            if template is None:
+                template = self._start_template()
+            return template.run(path, input_data, time_limit, memory_limit, filename, cancel_event, stdout_sink,
+                                native, stdin_file)
+        except Exception:
+            if template is not None:
+                self._discard_template(template)
+            template = None
+            raise
+        finally:
+            self._idle.put(template)
+    
+    def utilization(self):
+        """Доля занятых интерпретаторов"""
+        return 1 - self._idle.qsize() / self.size if self.size else 0.0
+    
+    def shutdown(self):
+        with self._lock:
+            templates = list(self._templates)
+        for template in templates:
+            self._discard_template(template)
+    
+    def detach(self):
+        """
+        Закрывает унаследованные после fork сокеты шаблонов, не останавливая сами
+        шаблоны: ими по-прежнему пользуется родительский процесс
+        """
+        for template in self._templates:
+            template.sock.close()
+
+_warm_pool = None
+_warm_pool_lock = threading.Lock()
+
+def _reset_warm_pool_after_fork():
+    """
+    Дочерний процесс (воркер ProcessPoolExecutor) не должен пользоваться
+    шаблонами родителя: запросы нескольких процессов в один SEQPACKET-сокет
+    перемешивают ответы. Дочерний процесс заводит свой пул при первом запуске
+    """
+    global _warm_pool, _warm_pool_lock
+    if _warm_pool is not None:
+        _warm_pool.detach()
+    _warm_pool = None
+    _warm_pool_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_warm_pool_after_fork)
+
+def get_warm_pool():
+    """Пул прогретых интерпретаторов (создается лениво, None если выключен)"""
+    global _warm_pool
+    if not JUDGE_WARM_POOL:
+        return None
+    with _warm_pool_lock:
+        if _warm_pool is None:
+            _warm_pool = WarmInterpreterPool(JUDGE_WORKERS, JUDGE_PRELOAD_MODULES)
+            atexit.register(_warm_pool.shutdown)
+        return _warm_pool
+
+def stage_python_submission(code):
+    """
+    Подготовка сабмишена к запуску: исходник пишется на диск один раз и
+    компилируется в .pyc, который затем используется всеми тестами.
+    Возвращает (staging_dir, pyc_path), при синтаксической ошибке бросает PyCompileError
+    """
+    staging_dir = tempfile.mkdtemp(prefix='judge_')
+    try:
+        source_path = os.path.join(staging_dir, 'solution.py')
+        with open(source_path, 'w') as f:
+            f.write(code)
+        pyc_path = source_path + 'c'
+        py_compile.compile(source_path, cfile=pyc_path, doraise=True)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return staging_dir, pyc_path
+
+class CompilationError(Exception):
+    """Ошибка компиляции сабмишена (вердикт CE), текст - вывод компилятора"""
+
+class CompilationTimeout(CompilationError):
+    """Компиляция не уложилась в JUDGE_COMPILE_TIMEOUT: зависит от нагрузки, как и TLE"""
+
+# Компилируемые языки: компилятор, флаги (входят в ключ кэша сборок) и расширение исходника
+COMPILED_LANGUAGES = {
+    'c': {'compiler': JUDGE_CC, 'flags': ['-O2', '-std=c11', '-pipe'], 'libs': ['-lm'], 'suffix': '.c'},
+    'cpp': {'compiler': JUDGE_CXX, 'flags': ['-O2', '-std=c++17', '-pipe'], 'libs': [], 'suffix': '.cpp'}
+}
+LANGUAGE_ALIASES = {'c++': 'cpp'}
+SUPPORTED_LANGUAGES = ('python',) + tuple(COMPILED_LANGUAGES)
+
+def normalize_language(language):
+    language = (language or 'python').lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+def _evict_least_recent(paths, max_files=None, max_bytes=None):
+    """Удаление файлов с самым старым mtime, пока их не больше max_files и суммарно не больше max_bytes"""
+    entries = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    count = len(entries)
+    for _, size, path in entries:
+        if (max_files is None or count <= max_files) and (max_bytes is None or total <= max_bytes):
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        count -= 1
+        total -= size
+
+class BuildCache:
+    """
+    Кэш собранных программ на диске. Имя бинарника - sha256 от компилятора,
+    флагов и исходника, поэтому повторная отправка и перепроверка того же кода
+    не компилируются заново. При превышении max_size удаляются бинарники,
+    которые дольше всех не использовались (по mtime).
+    """
+    
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def key(self, code, language):
+        config = COMPILED_LANGUAGES[language]
+        digest = hashlib.sha256()
+        digest.update(json.dumps([config['compiler'], config['flags'], config['libs']]).encode())
+        digest.update(b'\0')
+        digest.update(code.encode())
+        return digest.hexdigest()
+    
+    def _binaries(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        paths = [os.path.join(self.directory, name) for name in names if not name.startswith('build_')]
+        return [path for path in paths if os.path.isfile(path)]
+    
+    def get_or_build(self, code, language):
+        """
+        Путь к собранной программе и время компиляции (0 при попадании в кэш):
+        (binary_path, compile_time, cached). При ошибке компиляции бросает CompilationError
+        """
+        binary_path = os.path.join(self.directory, self.key(code, language))
+        try:
+            os.utime(binary_path)  # обновляем mtime - бинарник недавно использовался
+            with self._lock:
+                self.hits += 1
+            return binary_path, 0.0, True
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.misses += 1
+        
+        compile_time = self._compile(code, language, binary_path)
+        self._evict()
+        return binary_path, compile_time, False
+    
+    def _compile(self, code, language, binary_path):
+        config = COMPILED_LANGUAGES[language]
+        os.makedirs(self.directory, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix='build_', dir=self.directory)
+        try:
+            source_path = os.path.join(work_dir, 'solution' + config['suffix'])
+            output_path = os.path.join(work_dir, 'solution')
+            with open(source_path, 'w') as f:
+                f.write(code)
+            command = [config['compiler'], *config['flags'], source_path, '-o', output_path, *config['libs']]
+            started = time.monotonic()
+            try:
+                proc = subprocess.run(command, cwd=work_dir, capture_output=True, timeout=JUDGE_COMPILE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                raise CompilationTimeout('Превышено время компиляции')
+            compile_time = round(time.monotonic() - started, 3)
+            if proc.returncode != 0:
+                message = proc.stderr[:JUDGE_STDERR_LIMIT].decode(errors='replace')
+                raise CompilationError(message.replace(work_dir + os.sep, ''))
+            # Параллельная сборка того же кода просто перезапишет одинаковый файл
+            os.replace(output_path, binary_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return compile_time
+    
+    def _evict(self):
+        _evict_least_recent(self._binaries(), max_files=self.max_size)
+    
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
             return {
-                'stdout': result.stdout,
-                'stderr': result.stderr,
-                'returncode': result.returncode
+                'size': len(self._binaries()),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0
             }
+
+build_cache = BuildCache(BUILD_CACHE_DIR, BUILD_CACHE_SIZE)
+
+class TestInputStore:
+    """
+    Входные данные тестов в файлах на диске, имя файла - sha256 содержимого.
+    Файл пишется один раз и передается программе как stdin, поэтому параллельные
+    тесты и повторные проверки читают один и тот же файл (из page cache), а сам
+    сервис не копирует вход в pipe на каждый запуск. При превышении max_bytes
+    удаляются файлы, которые дольше всех не использовались.
+    """
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+    
+    def _files(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names if not name.startswith('.')]
+    
+    def open(self, input_data, digest=None):
+        """
+        Файл с input_data, открытый на чтение (digest - готовый input_digest,
+        чтобы не хэшировать заново). Возвращается открытый файл, а не путь:
+        вытеснение другим потоком после открытия запуску уже не мешает.
+        """
+        path = os.path.join(self.directory, digest or input_digest(input_data))
+        try:
+            stdin_file = open(path, 'rb')
+            os.utime(stdin_file.fileno())  # обновляем mtime - файл недавно использовался
+            return stdin_file
+        except FileNotFoundError:
+            pass
+        
+        os.makedirs(self.directory, exist_ok=True)
+        data = input_data.encode()
+        fd, tmp_path = tempfile.mkstemp(prefix='.input_', dir=self.directory)
+        stdin_file = None
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            stdin_file = open(tmp_path, 'rb')
+            os.replace(tmp_path, path)
+        except BaseException:
+            if stdin_file is not None:
+                stdin_file.close()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        # Только что записанный файл не вытесняем, даже если он один больше лимита
+        others = [other for other in self._files() if other != path]
+        _evict_least_recent(others, max_bytes=max(0, self.max_bytes - len(data)))
+        return stdin_file
+
+test_input_store = TestInputStore(TEST_INPUT_DIR, TEST_INPUT_CACHE_BYTES)
+
+def prepare_program(code, language):
+    """
+    Подготовка сабмишена к запуску - один раз на весь сабмишен, а не на каждый тест.
+    Python компилируется в .pyc, C/C++ собираются через build_cache.
+    Возвращает (staging_dir, program_path, compile_info), где compile_info -
+    {'compile_time', 'compile_cached'}. При ошибке компиляции бросает CompilationError
+    """
+    if language == 'python':
+        started = time.monotonic()
+        try:
+            staging_dir, program_path = stage_python_submission(code)
+        except py_compile.PyCompileError as e:
+            raise CompilationError(e.msg)
+        return staging_dir, program_path, {
+            'compile_time': round(time.monotonic() - started, 3),
+            'compile_cached': False
+        }
+    
+    binary_path, compile_time, cached = build_cache.get_or_build(code, language)
+    # Жесткая ссылка в свой каталог: вытеснение из кэша не помешает идущей проверке
+    staging_dir = tempfile.mkdtemp(prefix='judge_')
+    program_path = os.path.join(staging_dir, 'solution')
+    try:
+        try:
+            os.link(binary_path, program_path)
+        except OSError:
+            shutil.copy2(binary_path, program_path)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return staging_dir, program_path, {'compile_time': compile_time, 'compile_cached': cached}
+
+def run_program(path, input_data, time_limit=JUDGE_DEFAULT_TIME_LIMIT, memory_limit=None, cancel_event=None,
+                stdout_sink=None, stdin_file=None):
+    """
+    Запуск подготовленной программы (.pyc или собранный бинарник) на одном входе
+    с ограничениями по CPU-времени (секунды) и памяти (мегабайты). Если задан
+    cancel_event, запуск прерывается после его установки (результат с флагом
+    cancelled). stdout_sink - приемник вывода по кускам (например, OutputComparator.feed).
+    stdin_file - открытый файл со входом вместо input_data (см. TestInputStore).
+    Сбой самого запуска (упавший шаблон, ошибка передачи fd и т.п.) возвращается
+    с флагом internal_error: это не вина программы.
+    """
+    native = not path.endswith('.pyc')
+    # В трейсбеках показываем исходник, а не байткод
+    filename = path if native else path[:-1]
+    try:
+        pool = get_warm_pool()
+        if pool is not None:
+            return pool.run(path, input_data, time_limit, memory_limit, filename, cancel_event, stdout_sink,
+                            native, stdin_file)
+        
+        # Без пула - новый интерпретатор на каждый запуск
+        interpreter = TemplateInterpreter()
+        try:
+            return interpreter.run(path, input_data, time_limit, memory_limit, filename, cancel_event, stdout_sink,
+                                   native, stdin_file)
         finally:
-            os.unlink(temp_file)
-    except subprocess.TimeoutExpired:
-        return {'stdout': '', 'stderr': 'Timeout', 'returncode': -1}
+            interpreter.close()
+    except Exception as e:
+        return {'stdout': '', 'stderr': str(e), 'returncode': -1, 'internal_error': True}
+
+def run_python_code(code, input_data, time_limit=JUDGE_DEFAULT_TIME_LIMIT, memory_limit=None):
+    """Разовый запуск кода: подготовка, запуск и удаление временных файлов"""
+    try:
+        staging_dir, pyc_path = stage_python_submission(code)
+    except py_compile.PyCompileError as e:
+        return {'stdout': '', 'stderr': e.msg, 'returncode': 1}
     except Exception as e:
         return {'stdout': '', 'stderr': str(e), 'returncode': -1}
+    try:
+        return run_program(pyc_path, input_data, time_limit, memory_limit)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+# Программа проверки синтаксиса: исходник на stdin, результат - JSON в stdout
+_SYNTAX_CHECK_SOURCE = r"""
+import json, sys
+source = sys.stdin.buffer.read().decode(errors='replace')
+try:
+    compile(source, '<string>', 'exec')
+    print(json.dumps({'ok': True}))
+except (SyntaxError, ValueError) as e:
+    print(json.dumps({'ok': False, 'error': str(e)}))
+"""
+
+# Кэш проверок синтаксиса: sha256 исходника -> текст ошибки или None
+syntax_cache = LRUCache(SYNTAX_CACHE_SIZE)
+_syntax_checker_path = None
+_syntax_checker_lock = threading.Lock()
+
+def _get_syntax_checker():
+    global _syntax_checker_path
+    with _syntax_checker_lock:
+        if _syntax_checker_path is None or not os.path.exists(_syntax_checker_path):
+            staging_dir, _syntax_checker_path = stage_python_submission(_SYNTAX_CHECK_SOURCE)
+            atexit.register(shutil.rmtree, staging_dir, True)
+        return _syntax_checker_path
+
+class SyntaxCheckError(Exception):
+    """Проверка синтаксиса не состоялась (сбой или превышение ограничений у самого чекера)"""
+
+def check_python_syntax(code):
+    """
+    Проверка синтаксиса Python-кода. Возвращает None или текст ошибки.
+    compile выполняется не в процессе сервиса, а в дочернем процессе шаблонного
+    интерпретатора с ограничениями по времени и памяти, так что патологический
+    исходник не блокирует веб-воркер. Результаты кэшируются по хэшу исходника.
+    Если проверка не состоялась, бросается SyntaxCheckError (не кэшируется).
+    """
+    key = hashlib.sha256(code.encode()).hexdigest()
+    cached = syntax_cache.get(key)
+    if cached is not None:
+        return cached['error']
+    
+    run_result = run_program(_get_syntax_checker(), code, SYNTAX_CHECK_TIME_LIMIT, SYNTAX_CHECK_MEMORY_LIMIT)
+    verdict = run_verdict(run_result, {'time_limit': SYNTAX_CHECK_TIME_LIMIT,
+                                       'memory_limit': SYNTAX_CHECK_MEMORY_LIMIT})
+    if verdict in ('IE', 'TLE', 'MLE'):
+        raise SyntaxCheckError(f"Проверка синтаксиса: {verdict}: {run_result['stderr'].strip()}")
+    try:
+        checked = json.loads(run_result['stdout'])
+    except ValueError:
+        raise SyntaxCheckError(f"Проверка синтаксиса: {run_result['stderr'].strip()}")
+    error = None if checked['ok'] else checked['error']
+    syntax_cache.set(key, {'error': error})
+    return error
+
+def run_verdict(run_result, limits):
+    """
+    Вердикт по результату запуска без учета вывода:
+    IE (сбой проверяющей системы), OLE, TLE, MLE, RE или None, если программа
+    завершилась нормально
+    """
+    if run_result.get('internal_error'):
+        return 'IE'
+    if run_result.get('output_limit_exceeded'):
+        return 'OLE'
+    if run_result.get('timed_out') or run_result.get('returncode') == -signal.SIGXCPU:
+        return 'TLE'
+    if run_result.get('cpu_time', 0) > limits['time_limit']:
+        return 'TLE'
+    peak_rss_kb = run_result.get('peak_rss_kb', 0)
+    if peak_rss_kb > limits['memory_limit'] * 1024:
+        return 'MLE'
+    if run_result['returncode'] != 0:
+        if 'MemoryError' in run_result['stderr'] or 'std::bad_alloc' in run_result['stderr']:
+            return 'MLE'
+        return 'RE'
+    return None
+
+def exit_description(run_result):
+    """Описание завершения для RE без stderr (обычно у собранных программ)"""
+    returncode = run_result['returncode']
+    if returncode < 0:
+        try:
+            return f'Программа завершена сигналом {signal.Signals(-returncode).name}'
+        except ValueError:
+            pass
+    return f'Код возврата {returncode}'
+
+def judge_test_case(program_path, test_case, index, cancel_event=None, limits=None, checker=None, digest=None):
+    """
+    Запуск одного тест-кейса и формирование записи для details (checker - описание
+    чекера задачи, digest - input_digest входа теста, если уже посчитан)
+    """
+    limits = limits or get_problem_limits(None)
+    input_data = test_case.get('input', '')
+    try:
+        comparator = make_comparator(checker, test_case)
+    except CheckerError as e:
+        return {'test_case': index + 1, 'status': 'error', 'verdict': 'CF', 'error': str(e)}
+    try:
+        stdin_file = test_input_store.open(input_data, digest)
+    except OSError:
+        stdin_file = None  # нет места на диске - вход передается через временный файл
+    
+    try:
+        with judge_tests_in_flight.track_inprogress():
+            run_result = run_program(program_path, input_data, limits['time_limit'], limits['memory_limit'],
+                                     cancel_event=cancel_event, stdout_sink=comparator.feed, stdin_file=stdin_file)
+    finally:
+        if stdin_file is not None:
+            stdin_file.close()
+    
+    if run_result.get('cancelled'):
+        return {
+            'test_case': index + 1,
+            'status': 'skipped'
+        }
+    if run_result.get('wall_time') is not None:
+        judge_test_run_seconds.observe(run_result['wall_time'])
+    
+    entry = {
+        'test_case': index + 1,
+        'cpu_time': run_result.get('cpu_time'),
+        'wall_time': run_result.get('wall_time'),
+        'peak_rss_kb': run_result.get('peak_rss_kb')
+    }
+    verdict = run_verdict(run_result, limits)
+    if verdict == 'IE':
+        # Подробности сбоя (пути на хосте и т.п.) участнику не показываем
+        entry.update({'status': 'error', 'verdict': 'IE', 'error': 'Внутренняя ошибка проверяющей системы'})
+    elif verdict == 'TLE':
+        entry.update({'status': 'error', 'verdict': 'TLE', 'error': 'Превышено ограничение по времени'})
+    elif verdict == 'OLE':
+        entry.update({'status': 'error', 'verdict': 'OLE', 'error': 'Превышено ограничение на размер вывода'})
+    elif verdict == 'MLE':
+        entry.update({'status': 'error', 'verdict': 'MLE', 'error': 'Превышено ограничение по памяти'})
+    elif verdict == 'RE':
+        entry.update({'status': 'error', 'verdict': 'RE', 'error': run_result['stderr'] or exit_description(run_result)})
+    else:
+        started = time.perf_counter()
+        try:
+            accepted = comparator.finish()
+        except CheckerError as e:
+            entry.update({'status': 'error', 'verdict': 'CF', 'error': str(e)})
+            return entry
+        finally:
+            judge_comparison_seconds.observe(comparator.elapsed + time.perf_counter() - started)
+        if accepted:
+            entry.update({'status': 'passed', 'verdict': 'AC'})
+        else:
+            # Ожидаемый вывод, как и фактический, - только начало: ответ и кэш вердиктов не растут с размером теста
+            expected = test_case.get('output', '').strip().encode()
+            entry.update({
+                'status': 'failed',
+                'verdict': 'WA',
+                'expected': expected[:comparator.preview_limit].decode(errors='replace'),
+                'actual': comparator.preview
+            })
+            if len(expected) > comparator.preview_limit:
+                entry['expected_truncated'] = True
+            if comparator.truncated:
+                entry['actual_truncated'] = True
+        if comparator.message:
+            entry['checker_message'] = comparator.message
+    return entry
+
+# Кэш вердиктов: (хэш кода, язык, версия тестов, режим) -> ответ /compile
+verdict_cache = LRUCache(VERDICT_CACHE_SIZE)
+
+def normalize_source(code):
+    """
+    Нормализация исходника для ключа кэша: единые переводы строк и без
+    пробелов в конце файла. Пробелы в конце строк не трогаем - они могут
+    быть частью многострочного строкового литерала.
+    """
+    return code.replace('\r\n', '\n').replace('\r', '\n').rstrip()
+
+def verdict_cache_key(code, language, problem, mode):
+    code_hash = hashlib.sha256(normalize_source(code).encode()).hexdigest()
+    return (code_hash, language, get_test_set_version(problem), mode)
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых вызовов: пока по ключу идет проверка,
+    остальные вызовы с тем же ключом ждут ее и получают тот же результат.
+    В отличие от кэша вердиктов, результат не переживает сам вызов.
+    """
+    
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key, fn):
+        """Результат fn() и флаг, что он получен от чужого вызова: (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+        
+        try:
+            call['result'] = fn()
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+        return call['result'], False
+    
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._calls), 'coalesced': self.coalesced}
+
+# Проверки, идущие прямо сейчас, по тому же ключу, что и кэш вердиктов
+in_flight = SingleFlight()
+
+def is_cacheable(response):
+    """
+    Кэшируем только детерминированные вердикты: TLE и CE по таймауту компиляции
+    зависят от нагрузки на машину, а IE и ошибки без вердикта - это сбои самого запуска
+    """
+    for entry in response.get('details', []):
+        if entry['status'] == 'skipped':
+            continue
+        if entry.get('compile_timed_out'):
+            return False
+        if entry.get('verdict') not in ('AC', 'WA', 'RE', 'MLE', 'OLE', 'CE'):
+            return False
+    return True
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Общий пул воркеров для запуска тестов (создается лениво)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if JUDGE_EXECUTOR == 'process':
+                _executor = ProcessPoolExecutor(max_workers=JUDGE_WORKERS)
+            else:
+                _executor = ThreadPoolExecutor(max_workers=JUDGE_WORKERS, thread_name_prefix='judge')
+        return _executor
+
+class TestRuntimeStats:
+    """
+    Скользящее среднее (EWMA) времени выполнения по (задача, номер теста).
+    Хранится компактно - на задачу один array('d'), NaN для тестов без замеров.
+    Таблица периодически сохраняется в файл и загружается при старте, чтобы
+    история переживала перезапуск. Хранится не больше max_problems задач (LRU).
+    """
+    
+    def __init__(self, path, alpha=RUNTIME_STATS_ALPHA, max_problems=RUNTIME_STATS_MAX_PROBLEMS,
+                 save_interval=RUNTIME_STATS_SAVE_INTERVAL):
+        self.path = path
+        self.alpha = alpha
+        self.max_problems = max_problems
+        self.save_interval = save_interval
+        self._table = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._loaded = False
+        self._saver = None
+    
+    def _ensure_loaded(self):
+        # Вызывается под self._lock
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, values in data.items():
+            self._table[key] = array('d', (math.nan if v is None else v for v in values))
+    
+    def estimates(self, key, indexes):
+        """Оценки времени тестов indexes (None, если замеров не было)"""
+        with self._lock:
+            self._ensure_loaded()
+            row = self._table.get(key)
+            if row is None:
+                return [None] * len(indexes)
+            return [row[i] if i < len(row) and not math.isnan(row[i]) else None for i in indexes]
+    
+    def lpt_order(self, key, indexes):
+        """
+        Порядок запуска тестов: сначала тесты без замеров, затем по убыванию
+        среднего времени (longest processing time first), при равенстве - исходный
+        """
+        estimates = self.estimates(key, indexes)
+        return sorted(range(len(indexes)), key=lambda j: -math.inf if estimates[j] is None else -estimates[j])
+    
+    def record(self, key, index, seconds):
+        with self._lock:
+            self._ensure_loaded()
+            row = self._table.get(key)
+            if row is None:
+                row = self._table[key] = array('d')
+            self._table.move_to_end(key)
+            if index >= len(row):
+                row.extend([math.nan] * (index + 1 - len(row)))
+            previous = row[index]
+            row[index] = seconds if math.isnan(previous) else previous + self.alpha * (seconds - previous)
+            while len(self._table) > self.max_problems:
+                self._table.popitem(last=False)
+            self._dirty = True
+        self._ensure_saver()
+    
+    def save(self):
+        """Запись таблицы в файл (атомарно, через временный файл)"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {key: [None if math.isnan(v) else round(v, 4) for v in row] for key, row in self._table.items()}
+            self._dirty = False
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.runtime_stats_', dir=directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+    
+    def _save_loop(self):
+        while True:
+            time.sleep(self.save_interval)
+            self.save()
+    
+    def _ensure_saver(self):
+        with self._lock:
+            if self._saver is not None:
+                return
+            self._saver = threading.Thread(target=self._save_loop, name='runtime-stats-saver', daemon=True)
+            self._saver.start()
+        atexit.register(self.save)
+
+test_runtimes = TestRuntimeStats(RUNTIME_STATS_PATH)
+
+def runtime_key(problem):
+    """Ключ задачи в test_runtimes"""
+    return problem.get('problem_id') or get_test_set_version(problem)
+
+def _judge_queued_test_case(queued_at, *args):
+    judge_queue_wait_seconds.labels(queue='tests').observe(time.monotonic() - queued_at)
+    return judge_test_case(*args)
+
+def run_test_cases(program_path, test_cases, max_parallel=None, stop_on_failure=False, limits=None,
+                   progress=None, checker=None, input_digests=None, runtime_key=None, runtime_indexes=None):
+    """
+    Параллельный запуск тест-кейсов одного сабмишена (program_path - результат prepare_program,
+    limits - результат get_problem_limits, checker - описание чекера задачи,
+    input_digests - результат get_test_input_digests).
+    Одновременно выполняется не более max_parallel тестов, чтобы один большой
+    сабмишен не занимал весь пул. Результаты возвращаются в исходном порядке.
+    
+    Если задан runtime_key, время тестов записывается в test_runtimes, а тесты
+    запускаются начиная с самых долгих по истории. runtime_indexes - номера
+    тестов в задаче (с 0), если test_cases - только часть тестов.
+    
+    При stop_on_failure после первого непройденного теста новые тесты не
+    запускаются, а уже запущенные прерываются - они получают статус skipped.
+    progress(completed, total) вызывается после каждого завершенного теста.
+    """
+    limit = max_parallel or JUDGE_MAX_PARALLEL_PER_SUBMISSION
+    limit = max(1, min(limit, JUDGE_WORKERS))
+    executor = get_executor()
+    # threading.Event нельзя передать в другой процесс, поэтому в режиме
+    # 'process' отменяются только еще не запущенные тесты
+    cancel_event = threading.Event()
+    run_cancel_event = cancel_event if stop_on_failure and JUDGE_EXECUTOR != 'process' else None
+    
+    results = [None] * len(test_cases)
+    pending = {}
+    if runtime_indexes is None:
+        runtime_indexes = range(len(test_cases))
+    if runtime_key is not None:
+        order = test_runtimes.lpt_order(runtime_key, runtime_indexes)
+    else:
+        order = range(len(test_cases))
+    remaining = ((i, test_cases[i]) for i in order)
+    completed = 0
+    
+    def schedule_next():
+        if cancel_event.is_set():
+            return False
+        item = next(remaining, None)
+        if item is None:
+            return False
+        i, test_case = item
+        digest = input_digests[i] if input_digests else None
+        future = executor.submit(_judge_queued_test_case, time.monotonic(), program_path, test_case, i,
+                                 run_cancel_event, limits, checker, digest)
+        pending[future] = i
+        return True
+    
+    for _ in range(limit):
+        if not schedule_next():
+            break
+    
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            i = pending.pop(future)
+            completed += 1
+            if progress is not None:
+                progress(completed, len(test_cases))
+            if future.cancelled():
+                results[i] = {'test_case': i + 1, 'status': 'skipped'}
+                continue
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                results[i] = {'test_case': i + 1, 'status': 'error', 'error': str(e)}
+            if runtime_key is not None and results[i].get('wall_time') is not None:
+                test_runtimes.record(runtime_key, runtime_indexes[i], results[i]['wall_time'])
+            if stop_on_failure and results[i]['status'] not in ('passed', 'skipped'):
+                cancel_event.set()
+                for other in pending:
+                    other.cancel()
+            schedule_next()
+    
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = {'test_case': i + 1, 'status': 'skipped'}
+    
+    return results
+
+def order_test_groups(test_groups):
+    """Группы в порядке зависимостей, при прочих равных - в порядке объявления"""
+    ordered = []
+    done = set()
+    pending = list(test_groups)
+    while pending:
+        ready = [group for group in pending if all(d in done for d in group.get('depends_on', []))]
+        if not ready:
+            # Цикл или неизвестная зависимость - такие группы будут пропущены
+            ordered.extend(pending)
+            break
+        ordered.extend(ready)
+        done.update(group['id'] for group in ready)
+        pending = [group for group in pending if group['id'] not in done]
+    return ordered
+
+def run_test_groups(program_path, test_cases, test_groups, stop_on_failure=False, limits=None, progress=None,
+                    checker=None, input_digests=None, runtime_key=None):
+    """
+    Запуск тестов по группам (подзадачам), аргументы - как у run_test_cases.
+    Группа запускается, только если пройдены все группы из ее depends_on, иначе
+    ее тесты пропускаются. Группа оценивается целиком, поэтому внутри нее запуск
+    останавливается на первом непройденном тесте. Группа без тестов считается
+    непройденной. Тесты вне групп запускаются последними, независимо друг от
+    друга (с остановкой только при stop_on_failure). При stop_on_failure после
+    первой непройденной группы пропускается все остальное.
+    """
+    total = len(test_cases)
+    results = [None] * total
+    completed = 0
+    passed_groups = set()
+    stopped = False
+    
+    def skip(numbers):
+        nonlocal completed
+        for n in numbers:
+            if results[n - 1] is None:
+                results[n - 1] = {'test_case': n, 'status': 'skipped'}
+                completed += 1
+        if progress is not None:
+            progress(completed, total)
+    
+    def run(numbers, stop=True):
+        nonlocal completed
+        indexes = [n - 1 for n in numbers if results[n - 1] is None]
+        offset = completed
+        group_results = run_test_cases(
+            program_path, [test_cases[i] for i in indexes], stop_on_failure=stop, limits=limits,
+            progress=(lambda done, _: progress(offset + done, total)) if progress is not None else None,
+            checker=checker, input_digests=[input_digests[i] for i in indexes] if input_digests else None,
+            runtime_key=runtime_key, runtime_indexes=indexes
+        )
+        for i, result in zip(indexes, group_results):
+            results[i] = dict(result, test_case=i + 1)
+        completed += len(indexes)
+        return all(results[n - 1]['status'] == 'passed' for n in numbers)
+    
+    for group in order_test_groups(test_groups):
+        numbers = [n for n in group.get('tests', []) if 1 <= n <= total]
+        ready = all(d in passed_groups for d in group.get('depends_on', []))
+        if stopped or not ready:
+            skip(numbers)
+        elif numbers and run(numbers):
+            passed_groups.add(group['id'])
+        elif stop_on_failure:
+            stopped = True
+        for n in numbers:
+            results[n - 1]['group'] = group['id']
+    
+    ungrouped = [i + 1 for i, result in enumerate(results) if result is None]
+    if ungrouped and stopped:
+        skip(ungrouped)
+    elif ungrouped:
+        run(ungrouped, stop=stop_on_failure)
+    return results
+
+def score_test_groups(test_groups, results):
+    """
+    Итоги по группам: баллы начисляются за группу, все тесты которой пройдены.
+    status группы - passed, failed или skipped (не запускалась), для пропущенных
+    из-за зависимостей указывается failed_dependencies. Группа без тестов
+    баллов не получает.
+    """
+    by_number = {r['test_case']: r for r in results}
+    summaries = {}
+    for group in order_test_groups(test_groups):
+        statuses = [by_number[n]['status'] for n in group.get('tests', []) if n in by_number]
+        points = group.get('points', 0)
+        summary = {'id': group['id'], 'points': points, 'score': 0}
+        if statuses and all(status == 'passed' for status in statuses):
+            summary.update({'status': 'passed', 'score': points})
+        elif statuses and all(status == 'skipped' for status in statuses):
+            summary['status'] = 'skipped'
+            failed_dependencies = [
+                d for d in group.get('depends_on', [])
+                if d not in summaries or summaries[d]['status'] != 'passed'
+            ]
+            if failed_dependencies:
+                summary['failed_dependencies'] = failed_dependencies
+        else:
+            summary['status'] = 'failed'
+        summaries[group['id']] = summary
+    return [summaries[group['id']] for group in test_groups]
 
 @app.route('/health', methods=['GET'])
 @swag_from({
@@ -89,6 +1854,28 @@ def run_python_code(code, input_data):
 def health():
     return jsonify({'status': 'ok', 'service': 'compiler_service'})
 
+JUDGE_MODES = ('all', 'first_failure')
+
+def validate_judge_request(data):
+    """
+    Проверка запроса на проверку (тело /compile, /jobs или сообщения очереди):
+    код, режим, язык и размер исходника. Возвращает текст ошибки или None.
+    """
+    if not isinstance(data, dict):
+        return 'Код отсутствует'
+    code = data.get('code')
+    mode = data.get('mode', 'all')
+    language = data.get('language') or 'python'
+    if not code or not isinstance(code, str):
+        return 'Код отсутствует'
+    if mode not in JUDGE_MODES:
+        return f'Неизвестный режим: {mode}'
+    if not isinstance(language, str) or normalize_language(language) not in SUPPORTED_LANGUAGES:
+        return f'Неподдерживаемый язык: {language}'
+    if len(code.encode()) > JUDGE_MAX_SOURCE_SIZE:
+        return f'Исходник больше {JUDGE_MAX_SOURCE_SIZE} байт'
+    return None
+
 @app.route('/compile', methods=['POST'])
 @swag_from({
     'tags': ['Compiler'],
@@ -103,8 +1890,14 @@ def health():
             'properties': {
                 'submission_id': {'type': 'string'},
                 'code': {'type': 'string', 'description': 'Код для компиляции'},
-                'language': {'type': 'string', 'default': 'python'},
-                'problem_id': {'type': 'string', 'description': 'ID задачи для получения тест-кейсов'}
+                'language': {'type': 'string', 'enum': ['python', 'c', 'cpp'], 'default': 'python'},
+                'problem_id': {'type': 'string', 'description': 'ID задачи для получения тест-кейсов'},
+                'mode': {
+                    'type': 'string',
+                    'enum': ['all', 'first_failure'],
+                    'default': 'all',
+                    'description': 'first_failure - остановка на первом непройденном тесте'
+                }
             }
         }
     }],
@@ -119,75 +1912,110 @@ def health():
                     'details': {'type': 'array'},
                     'passed': {'type': 'integer'},
                     'failed': {'type': 'integer'},
-                    'total': {'type': 'integer'}
+                    'skipped': {'type': 'array', 'items': {'type': 'integer'}},
+                    'total': {'type': 'integer'},
+                    'score': {'type': 'number', 'description': 'Баллы (если у задачи есть группы тестов)'},
+                    'max_score': {'type': 'number'},
+                    'groups': {'type': 'array', 'description': 'Итоги по группам: id, points, score, status'},
+                    'compile_time': {'type': 'number', 'description': 'Время компиляции (0 - сборка из кэша)'},
+                    'compile_cached': {'type': 'boolean'}
                 }
             }
         },
-        400: {'description': 'Код отсутствует'}
+        400: {'description': 'Код отсутствует или слишком большой, неизвестный режим или язык'}
     }
 })
 def compile_and_test():
     data = request.get_json()
-    submission_id = data.get('submission_id')
-    code = data.get('code')
-    language = data.get('language', 'python')
-    problem_id = data.get('problem_id')
-    
-    if not code:
-        return jsonify({'status': 'error', 'result': 'Код отсутствует'}), 400
+    error = validate_judge_request(data)
+    if error:
+        return jsonify({'status': 'error', 'result': error}), 400
     
-    # Получаем тест-кейсы
-    test_cases = get_problem_test_cases(problem_id) if problem_id else []
+    problem_id = data.get('problem_id')
+    problem = get_problem(problem_id) if problem_id else None
+    return jsonify(judge_submission(data['code'], data.get('language'), problem, data.get('mode', 'all'))), 200
+
+def judge_submission(code, language, problem, mode='all', progress=None):
+    """
+    Проверка кода на тестах задачи (problem - результат get_problem или None).
+    Возвращает тело ответа /compile. Повторная проверка того же кода на той же
+    версии тестов берется из кэша вердиктов, а одновременные одинаковые
+    проверки объединяются (ответ с coalesced=True). progress - см. run_test_cases.
+    """
+    error = validate_judge_request({'code': code, 'language': language, 'mode': mode})
+    if error:
+        return {'status': 'error', 'result': error}
+    language = normalize_language(language)
+    test_cases = problem.get('test_cases', []) if problem else []
     
     if not test_cases:
         # Если тест-кейсов нет, просто проверяем синтаксис
         if language == 'python':
             try:
-                compile(code, '<string>', 'exec')
-                return jsonify({
+                error = check_python_syntax(code)
+            except SyntaxCheckError:
+                # Подробности (пути, текст исключения) наружу не отдаем
+                return {'status': 'error', 'result': 'Внутренняя ошибка проверяющей системы'}
+            if error is None:
+                return {
                     'status': 'success',
                     'result': 'Код скомпилирован успешно (тест-кейсы отсутствуют)'
-                }), 200
-            except SyntaxError as e:
-                return jsonify({
-                    'status': 'error',
-                    'result': f'Синтаксическая ошибка: {str(e)}'
-                }), 200
-    
-    # Запускаем тесты
-    passed = 0
-    failed = 0
-    results = []
-    
-    for i, test_case in enumerate(test_cases):
-        input_data = test_case.get('input', '')
-        expected_output = test_case.get('output', '').strip()
-        
-        if language == 'python':
-            run_result = run_python_code(code, input_data)
-            actual_output = run_result['stdout'].strip()
-            
-            if run_result['returncode'] != 0:
-                results.append({
-                    'test_case': i + 1,
-                    'status': 'error',
-                    'error': run_result['stderr']
-                })
-                failed += 1
-            elif actual_output == expected_output:
-                results.append({
-                    'test_case': i + 1,
-                    'status': 'passed'
-                })
-                passed += 1
-            else:
-                results.append({
-                    'test_case': i + 1,
-                    'status': 'failed',
-                    'expected': expected_output,
-                    'actual': actual_output
-                })
-                failed += 1
+                }
+            return {
+                'status': 'error',
+                'result': f'Синтаксическая ошибка: {error}'
+            }
+        # Компилируемые языки - только сборка (результат попадет в кэш сборок)
+        try:
+            staging_dir, _, compile_info = prepare_program(code, language)
+        except CompilationError as e:
+            return {'status': 'error', 'result': f'Ошибка компиляции: {e}'}
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return dict(compile_info, status='success', result='Код скомпилирован успешно (тест-кейсы отсутствуют)')
+    
+    cache_key = verdict_cache_key(code, language, problem, mode)
+    cached = verdict_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached, cached=True)
+    
+    # Одинаковые сабмишены, пришедшие одновременно, проверяются один раз
+    response, shared = in_flight.do(
+        cache_key,
+        lambda: _judge_and_cache(code, language, problem, mode, progress, cache_key)
+    )
+    return dict(response, coalesced=True) if shared else response
+
+def _judge_and_cache(code, language, problem, mode, progress, cache_key):
+    test_cases = problem.get('test_cases', [])
+    test_groups = problem.get('test_groups')
+    # Код компилируется один раз на весь сабмишен, затем запускаются тесты
+    compile_info = {}
+    try:
+        staging_dir, program_path, compile_info = prepare_program(code, language)
+    except CompilationError as e:
+        results = [
+            {'test_case': i + 1, 'status': 'error', 'verdict': 'CE', 'error': str(e)}
+            for i in range(len(test_cases))
+        ]
+        if isinstance(e, CompilationTimeout):
+            for r in results:
+                r['compile_timed_out'] = True
+    else:
+        run = run_test_groups if test_groups else run_test_cases
+        kwargs = {'test_groups': test_groups} if test_groups else {}
+        try:
+            results = run(program_path, test_cases, stop_on_failure=mode == 'first_failure',
+                          limits=get_problem_limits(problem), progress=progress, checker=problem.get('checker'),
+                          input_digests=get_test_input_digests(problem), runtime_key=runtime_key(problem), **kwargs)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    for r in results:
+        if r.get('verdict'):
+            judge_verdicts_total.labels(verdict=r['verdict']).inc()
+    passed = sum(1 for r in results if r['status'] == 'passed')
+    skipped = [r['test_case'] for r in results if r['status'] == 'skipped']
+    failed = len(results) - passed - len(skipped)
     
     if failed == 0 and passed > 0:
         status = 'success'
@@ -199,14 +2027,317 @@ def compile_and_test():
         status = 'failed'
         result_message = f'Провалено {failed} тестов'
     
-    return jsonify({
+    response = {
         'status': status,
         'result': result_message,
         'details': results,
         'passed': passed,
         'failed': failed,
+        'skipped': skipped,
         'total': len(test_cases)
+    }
+    if test_groups:
+        groups = score_test_groups(test_groups, results)
+        response['groups'] = groups
+        response['score'] = sum(group['score'] for group in groups)
+        response['max_score'] = sum(group['points'] for group in groups)
+        if status != 'success':
+            response['result'] = f"Набрано {response['score']} из {response['max_score']} баллов"
+    response.update(compile_info)
+    if results and is_cacheable(response):
+        verdict_cache.set(cache_key, response)
+    return response
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+def get_batch_executor():
+    """Пул потоков, ведущих сабмишены пакетной проверки (создается лениво)"""
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            _batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='batch')
+        return _batch_executor
+
+def judge_batch(submissions, problem, mode='all'):
+    """
+    Проверка многих сабмишенов одной задачи. Задача уже загружена один раз,
+    до BATCH_CONCURRENCY сабмишенов проверяются одновременно, и их тесты
+    распределяются по общему пулу воркеров. Генерирует строки NDJSON по мере
+    завершения сабмишенов, последней идет итоговая строка с done=True.
+    """
+    started = time.monotonic()
+    executor = get_batch_executor()
+    futures = {}
+    statuses = Counter()
+    
+    def judge_one(item):
+        error = validate_judge_request(dict(item, mode=mode) if isinstance(item, dict) else item)
+        if error:
+            return {'status': 'error', 'result': error}
+        return judge_submission(item['code'], item.get('language'), problem, mode)
+    
+    try:
+        for index, item in enumerate(submissions):
+            futures[executor.submit(judge_one, item)] = index
+        for future in as_completed(futures):
+            index = futures[future]
+            item = submissions[index]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'status': 'error', 'result': str(e)}
+            statuses[result['status']] += 1
+            line = dict(result, index=index,
+                        submission_id=item.get('submission_id') if isinstance(item, dict) else None)
+            yield json.dumps(line, ensure_ascii=False) + '\n'
+        yield json.dumps({
+            'done': True,
+            'total': len(submissions),
+            'statuses': dict(statuses),
+            'elapsed': round(time.monotonic() - started, 3)
+        }) + '\n'
+    finally:
+        # Клиент отключился - непроверенные сабмишены не запускаем
+        for future in futures:
+            future.cancel()
+
+@app.route('/compile/batch', methods=['POST'])
+@swag_from({
+    'tags': ['Compiler'],
+    'summary': 'Пакетная проверка сабмишенов одной задачи (перепроверка)',
+    'description': 'Ответ - NDJSON: по строке на сабмишен в порядке завершения '
+                   '(поля ответа /compile, index и submission_id), последняя строка - итог с done=true',
+    'parameters': [{
+        'name': 'body',
+        'in': 'body',
+        'required': True,
+        'schema': {
+            'type': 'object',
+            'required': ['problem_id', 'submissions'],
+            'properties': {
+                'problem_id': {'type': 'string'},
+                'mode': {'type': 'string', 'enum': ['all', 'first_failure'], 'default': 'all'},
+                'submissions': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'submission_id': {'type': 'string'},
+                            'code': {'type': 'string'},
+                            'language': {'type': 'string', 'enum': ['python', 'c', 'cpp'], 'default': 'python'}
+                        }
+                    }
+                }
+            }
+        }
+    }],
+    'produces': ['application/x-ndjson'],
+    'responses': {
+        200: {'description': 'Поток результатов (NDJSON)'},
+        400: {'description': 'Нет сабмишенов, слишком большой пакет или неизвестный режим'},
+        404: {'description': 'Задача не найдена'}
+    }
+})
+def compile_batch():
+    data = request.get_json()
+    submissions = data.get('submissions')
+    problem_id = data.get('problem_id')
+    mode = data.get('mode', 'all')
+    
+    if not isinstance(submissions, list) or not submissions:
+        return jsonify({'status': 'error', 'result': 'Список сабмишенов пуст'}), 400
+    if len(submissions) > BATCH_MAX_SUBMISSIONS:
+        return jsonify({'status': 'error', 'result': f'Не больше {BATCH_MAX_SUBMISSIONS} сабмишенов за запрос'}), 400
+    if mode not in JUDGE_MODES:
+        return jsonify({'status': 'error', 'result': f'Неизвестный режим: {mode}'}), 400
+    if not problem_id:
+        return jsonify({'status': 'error', 'result': 'problem_id обязателен'}), 400
+    
+    problem = get_problem(problem_id)
+    if problem is None:
+        return jsonify({'status': 'error', 'result': 'Задача не найдена'}), 404
+    return Response(judge_batch(submissions, problem, mode), mimetype='application/x-ndjson')
+
+# Асинхронные задания: job_id -> задание; завершенные задания старше
+# JOB_RETENTION последних вытесняются
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+job_queue = queue.Queue(maxsize=JOB_QUEUE_SIZE)
+_job_workers = []
+_job_workers_lock = threading.Lock()
+
+def _forget_old_jobs():
+    finished = [job_id for job_id, job in jobs.items() if job['status'] in ('done', 'error')]
+    for job_id in finished[:max(0, len(finished) - JOB_RETENTION)]:
+        del jobs[job_id]
+
+def process_job(job):
+    """Проверка одного задания в потоке-исполнителе"""
+    def progress(completed, total):
+        job['progress'] = {'completed': completed, 'total': total}
+    
+    judge_queue_wait_seconds.labels(queue='jobs').observe(time.monotonic() - job['_queued_at'])
+    job['status'] = 'running'
+    job['started_at'] = datetime.now().isoformat()
+    try:
+        problem = get_problem(job['problem_id']) if job['problem_id'] else None
+        test_cases = problem.get('test_cases', []) if problem else []
+        job['progress'] = {'completed': 0, 'total': len(test_cases)}
+        job['result'] = judge_submission(job['code'], job['language'], problem, job['mode'], progress)
+        job['status'] = 'done'
+    except Exception as e:
+        job['result'] = {'status': 'error', 'result': str(e)}
+        job['status'] = 'error'
+    job['code'] = None
+    job['finished_at'] = datetime.now().isoformat()
+    with jobs_lock:
+        _forget_old_jobs()
+
+def _job_worker_loop():
+    while True:
+        job = job_queue.get()
+        try:
+            process_job(job)
+        finally:
+            job_queue.task_done()
+
+def ensure_job_workers():
+    """Потоки-исполнители заданий (стартуют при первом задании)"""
+    with _job_workers_lock:
+        while len(_job_workers) < JOB_WORKERS:
+            worker = threading.Thread(target=_job_worker_loop, name=f'job-worker-{len(_job_workers)}', daemon=True)
+            worker.start()
+            _job_workers.append(worker)
+
+def public_job(job):
+    return {key: value for key, value in job.items() if key != 'code' and not key.startswith('_')}
+
+@app.route('/jobs', methods=['POST'])
+@swag_from({
+    'tags': ['Jobs'],
+    'summary': 'Постановка кода в очередь на проверку',
+    'parameters': [{
+        'name': 'body',
+        'in': 'body',
+        'required': True,
+        'schema': {
+            'type': 'object',
+            'required': ['code'],
+            'properties': {
+                'submission_id': {'type': 'string'},
+                'code': {'type': 'string'},
+                'language': {'type': 'string', 'enum': ['python', 'c', 'cpp'], 'default': 'python'},
+                'problem_id': {'type': 'string'},
+                'mode': {'type': 'string', 'enum': ['all', 'first_failure'], 'default': 'all'}
+            }
+        }
+    }],
+    'responses': {
+        202: {'description': 'Задание принято, статус - GET /jobs/<job_id>'},
+        400: {'description': 'Код отсутствует или слишком большой, неизвестный режим или язык'},
+        429: {'description': 'Очередь заполнена, повторите позже'}
+    }
+})
+def create_job():
+    data = request.get_json()
+    error = validate_judge_request(data)
+    if error:
+        return jsonify({'status': 'error', 'result': error}), 400
+    code = data['code']
+    mode = data.get('mode', 'all')
+    language = data.get('language') or 'python'
+    
+    job_id = f"job_{uuid.uuid4().hex}"
+    job = {
+        'job_id': job_id,
+        'submission_id': data.get('submission_id'),
+        'problem_id': data.get('problem_id'),
+        'language': language,
+        'mode': mode,
+        'code': code,
+        'status': 'queued',
+        'progress': {'completed': 0, 'total': None},
+        'result': None,
+        'created_at': datetime.now().isoformat(),
+        'started_at': None,
+        'finished_at': None,
+        '_queued_at': time.monotonic()
+    }
+    
+    ensure_job_workers()
+    with jobs_lock:
+        jobs[job_id] = job
+    try:
+        job_queue.put_nowait(job)
+    except queue.Full:
+        with jobs_lock:
+            del jobs[job_id]
+        return jsonify({'message': 'Очередь проверки заполнена'}), 429, {'Retry-After': '1'}
+    
+    return jsonify(public_job(job)), 202, {'Location': f'/jobs/{job_id}'}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@swag_from({
+    'tags': ['Jobs'],
+    'summary': 'Статус и результат задания',
+    'parameters': [{
+        'name': 'job_id',
+        'in': 'path',
+        'type': 'string',
+        'required': True
+    }],
+    'responses': {200: {'description': 'Задание'}, 404: {'description': 'Задание не найдено'}}
+})
+def get_job(job_id):
+    with jobs_lock:
+        job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'message': 'Задание не найдено'}), 404
+    return jsonify(public_job(job)), 200
+
+@app.route('/cache/stats', methods=['GET'])
+@swag_from({
+    'tags': ['Compiler'],
+    'summary': 'Статистика кэшей вердиктов, задач и сборок',
+    'responses': {200: {'description': 'Размер кэша и число попаданий/промахов'}}
+})
+def cache_stats():
+    return jsonify({
+        'verdict_cache': verdict_cache.stats(),
+        'problem_cache': problems_cache.stats(),
+        'build_cache': build_cache.stats(),
+        'syntax_cache': syntax_cache.stats(),
+        'in_flight': in_flight.stats()
     }), 200
 
+@app.route('/cache/problems/<problem_id>', methods=['DELETE'])
+@swag_from({
+    'tags': ['Compiler'],
+    'summary': 'Сброс закэшированных тест-кейсов задачи',
+    'parameters': [{
+        'name': 'problem_id',
+        'in': 'path',
+        'type': 'string',
+        'required': True
+    }],
+    'responses': {200: {'description': 'Задача удалена из кэша'}}
+})
+def invalidate_problem_cache(problem_id):
+    removed = invalidate_problem(problem_id)
+    return jsonify({'problem_id': problem_id, 'invalidated': removed}), 200
+
+judge_pool_utilization.set_function(lambda: _warm_pool.utilization() if _warm_pool is not None else 0.0)
+judge_job_queue_size.set_function(lambda: job_queue.qsize())
+judge_cache_hit_ratio.labels(cache='problem').set_function(lambda: problems_cache.stats()['hit_ratio'])
+judge_cache_hit_ratio.labels(cache='verdict').set_function(lambda: verdict_cache.stats()['hit_ratio'])
+judge_cache_hit_ratio.labels(cache='build').set_function(lambda: build_cache.stats()['hit_ratio'])
+judge_cache_hit_ratio.labels(cache='syntax').set_function(lambda: syntax_cache.stats()['hit_ratio'])
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus метрики endpoint"""
+    return generate_latest(REGISTRY), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5005, debug=True)
@@ -0,0 +1,344 @@
+"""
+Бенчмарк проверки решений в compiler_service.
+
+Гоняет набор синтетических задач (простой ввод-вывод, тяжелые вычисления,
+большой ввод, большой вывод, TLE) через compile_and_test и сохраняет
+результаты в JSON, чтобы их можно было сравнивать между коммитами.
+
+Режимы:
+  inprocess - запросы через Flask test client, без сети
+  http      - сервис поднимается на локальном порту, запросы идут по HTTP
+
+Задачи подставляются вместо admin_service, кэш вердиктов выключен, а в код
+каждой отправки добавляется уникальный комментарий, чтобы одинаковые
+отправки не объединялись и не брались из кэша.
+
+Запуск:
+  python benchmark.py --mode inprocess --repeat 5 --output bench.json
+  python benchmark.py --mode http --concurrency 4 --compare bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+import app as compiler_app
+
+def _trivial_io(rng, scale):
+    tests = []
+    for _ in range(max(1, int(20 * scale))):
+        a, b = rng.randint(-10 ** 9, 10 ** 9), rng.randint(-10 ** 9, 10 ** 9)
+        tests.append({'input': f'{a} {b}\n', 'output': f'{a + b}\n'})
+    code = "a, b = map(int, input().split())\nprint(a + b)\n"
+    return tests, code
+
+def _cpu_heavy(rng, scale):
+    tests = []
+    for _ in range(max(1, int(5 * scale))):
+        n = rng.randint(200000, 300000)
+        tests.append({'input': f'{n}\n', 'output': f'{sum(i * i % 7 for i in range(n))}\n'})
+    code = "n = int(input())\ns = 0\nfor i in range(n):\n    s += i * i % 7\nprint(s)\n"
+    return tests, code
+
+def _big_input(rng, scale):
+    tests = []
+    for _ in range(max(1, int(3 * scale))):
+        numbers = [rng.randint(0, 10 ** 6) for _ in range(100000)]
+        tests.append({
+            'input': f'{len(numbers)}\n' + ' '.join(map(str, numbers)) + '\n',
+            'output': f'{sum(numbers)}\n'
+        })
+    code = "import sys\ndata = sys.stdin.buffer.read().split()\nprint(sum(map(int, data[1:])))\n"
+    return tests, code
+
+def _big_output(rng, scale):
+    tests = []
+    for _ in range(max(1, int(3 * scale))):
+        n = rng.randint(100000, 150000)
+        tests.append({'input': f'{n}\n', 'output': '\n'.join(str(i) for i in range(n)) + '\n'})
+    code = "import sys\nn = int(input())\nsys.stdout.write('\\n'.join(map(str, range(n))) + '\\n')\n"
+    return tests, code
+
+def _tle(rng, scale):
+    tests = [{'input': '', 'output': ''} for _ in range(max(1, int(2 * scale)))]
+    return tests, "while True:\n    pass\n"
+
+# Имя задачи -> (генератор тестов и решения, ограничения, ожидаемый вердикт)
+CORPUS = {
+    'trivial_io': (_trivial_io, {'time_limit': 2, 'memory_limit': 256}, 'AC'),
+    'cpu_heavy': (_cpu_heavy, {'time_limit': 5, 'memory_limit': 256}, 'AC'),
+    'big_input': (_big_input, {'time_limit': 5, 'memory_limit': 256}, 'AC'),
+    'big_output': (_big_output, {'time_limit': 5, 'memory_limit': 256}, 'AC'),
+    'tle': (_tle, {'time_limit': 1, 'memory_limit': 256}, 'TLE')
+}
+
+def build_corpus(names, scale=1.0, seed=42):
+    """Синтетические задачи: name -> {'problem', 'code', 'expected'}"""
+    corpus = {}
+    for name in names:
+        generate, limits, expected = CORPUS[name]
+        tests, code = generate(random.Random(f'{seed}:{name}'), scale)
+        problem = dict(limits, problem_id=f'bench_{name}', test_cases=tests, checker={'type': 'exact'})
+        corpus[name] = {'problem': problem, 'code': code, 'expected': expected}
+    return corpus
+
+def percentile(values, q):
+    """Перцентиль q (0-100) с линейной интерполяцией"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def latency_summary(seconds):
+    """p50/p95/p99/max в миллисекундах"""
+    summary = {}
+    for label, q in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100)):
+        value = percentile(seconds, q)
+        summary[label] = round(value * 1000, 2) if value is not None else None
+    return summary
+
+def install_corpus(corpus):
+    """Задачи корпуса вместо admin_service и выключенный кэш вердиктов"""
+    problems = {entry['problem']['problem_id']: entry['problem'] for entry in corpus.values()}
+    compiler_app.get_problem = problems.get
+    compiler_app.verdict_cache = compiler_app.LRUCache(0)
+
+class InProcessClient:
+    """Запросы через Flask test client, без сети"""
+
+    def compile(self, payload):
+        # Свой test client на запрос - один клиент не рассчитан на несколько потоков
+        response = compiler_app.app.test_client().post('/compile', json=payload)
+        return response.status_code, response.get_json()
+
+    def close(self):
+        pass
+
+class HttpClient:
+    """Сервис на локальном порту (werkzeug, многопоточный) и запросы к нему по HTTP"""
+
+    def __init__(self):
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.server = make_server('127.0.0.1', 0, compiler_app.app, threaded=True)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.session = requests.Session()
+
+    def compile(self, payload):
+        response = self.session.post(f'{self.url}/compile', json=payload)
+        return response.status_code, response.json()
+
+    def close(self):
+        self.session.close()
+        self.server.shutdown()
+
+def measure_startup(samples):
+    """
+    Накладные расходы на запуск пустой программы: прогретый пул шаблонов,
+    новый шаблонный интерпретатор на каждый запуск и чистый python -c pass
+    """
+    staging_dir, program_path = compiler_app.stage_python_submission('pass\n')
+    try:
+        warm, cold, bare = [], [], []
+        pool = compiler_app.get_warm_pool()
+        for _ in range(samples):
+            if pool is not None:
+                started = time.perf_counter()
+                pool.run(program_path, '', 5)
+                warm.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            interpreter = compiler_app.TemplateInterpreter()
+            try:
+                interpreter.run(program_path, '', 5)
+            finally:
+                interpreter.close()
+            cold.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'pass'], check=True)
+            bare.append(time.perf_counter() - started)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return {
+        'warm_pool': latency_summary(warm),
+        'cold_template': latency_summary(cold),
+        'bare_python': latency_summary(bare)
+    }
+
+def run_problem(client, name, entry, repeat, concurrency, mode):
+    """Отправка решения задачи repeat раз по concurrency одновременно"""
+    def submit(i):
+        payload = {
+            'code': entry['code'] + f'# bench {name} {i} {time.time_ns()}\n',
+            'language': 'python',
+            'problem_id': entry['problem']['problem_id'],
+            'mode': mode
+        }
+        started = time.perf_counter()
+        status_code, body = client.compile(payload)
+        return status_code, body, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        responses = list(executor.map(submit, range(repeat)))
+    elapsed = time.perf_counter() - started
+
+    test_latencies, request_latencies = [], []
+    verdicts = Counter()
+    errors = 0
+    for status_code, body, latency in responses:
+        request_latencies.append(latency)
+        if status_code != 200:
+            errors += 1
+            continue
+        for detail in body.get('details', []):
+            verdicts[detail.get('verdict', detail['status'])] += 1
+            if detail.get('wall_time') is not None:
+                test_latencies.append(detail['wall_time'])
+    tests = sum(verdicts.values())
+    unexpected = tests - verdicts[entry['expected']]
+    return {
+        'submissions': repeat,
+        'tests': tests,
+        'elapsed_sec': round(elapsed, 3),
+        'tests_per_sec': round(tests / elapsed, 2) if elapsed else None,
+        'submissions_per_sec': round(repeat / elapsed, 2) if elapsed else None,
+        'test_latency_ms': latency_summary(test_latencies),
+        'request_latency_ms': latency_summary(request_latencies),
+        'verdicts': dict(verdicts),
+        'unexpected_verdicts': unexpected,
+        'http_errors': errors
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmark(mode='inprocess', problems=None, repeat=5, concurrency=1, scale=1.0, judge_mode='all',
+                  startup_samples=20, seed=42):
+    """Прогон бенчмарка, возвращает отчет (dict, сериализуется в JSON)"""
+    names = problems or list(CORPUS)
+    corpus = build_corpus(names, scale, seed)
+    install_corpus(corpus)
+
+    client = HttpClient() if mode == 'http' else InProcessClient()
+    try:
+        # Прогрев: старт пула шаблонов и воркеров не входит в замеры
+        first = corpus[names[0]]
+        client.compile({'code': 'print(1)\n', 'problem_id': first['problem']['problem_id']})
+        results = {name: run_problem(client, name, corpus[name], repeat, concurrency, judge_mode)
+                   for name in names}
+    finally:
+        client.close()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'mode': mode,
+            'judge_mode': judge_mode,
+            'repeat': repeat,
+            'concurrency': concurrency,
+            'scale': scale,
+            'seed': seed,
+            'settings': {
+                'JUDGE_EXECUTOR': compiler_app.JUDGE_EXECUTOR,
+                'JUDGE_WORKERS': compiler_app.JUDGE_WORKERS,
+                'JUDGE_MAX_PARALLEL_PER_SUBMISSION': compiler_app.JUDGE_MAX_PARALLEL_PER_SUBMISSION,
+                'JUDGE_WARM_POOL': compiler_app.JUDGE_WARM_POOL
+            }
+        },
+        'problems': results
+    }
+    if startup_samples:
+        report['startup_ms'] = measure_startup(startup_samples)
+
+    total_tests = sum(r['tests'] for r in results.values())
+    total_elapsed = sum(r['elapsed_sec'] for r in results.values())
+    report['total'] = {
+        'tests': total_tests,
+        'elapsed_sec': round(total_elapsed, 3),
+        'tests_per_sec': round(total_tests / total_elapsed, 2) if total_elapsed else None,
+        'unexpected_verdicts': sum(r['unexpected_verdicts'] for r in results.values())
+    }
+    return report
+
+def compare_reports(baseline, current):
+    """Строки сравнения с предыдущим прогоном: tests/sec и p95 по задачам"""
+    lines = [f"{'задача':<12} {'tests/s было':>13} {'стало':>9} {'p95 было':>10} {'стало':>9}"]
+    for name, result in current['problems'].items():
+        before = baseline.get('problems', {}).get(name)
+        if before is None:
+            continue
+        lines.append(
+            f"{name:<12} {before['tests_per_sec'] or 0:>13.2f} {result['tests_per_sec'] or 0:>9.2f} "
+            f"{before['test_latency_ms']['p95'] or 0:>10.2f} {result['test_latency_ms']['p95'] or 0:>9.2f}"
+        )
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк проверки решений compiler_service')
+    parser.add_argument('--mode', choices=['inprocess', 'http'], default='inprocess')
+    parser.add_argument('--problems', default=','.join(CORPUS),
+                        help='Задачи через запятую: ' + ', '.join(CORPUS))
+    parser.add_argument('--repeat', type=int, default=5, help='Отправок на задачу')
+    parser.add_argument('--concurrency', type=int, default=1, help='Одновременных отправок')
+    parser.add_argument('--scale', type=float, default=1.0, help='Множитель числа тестов')
+    parser.add_argument('--judge-mode', choices=['all', 'first_failure'], default='all')
+    parser.add_argument('--startup-samples', type=int, default=20, help='0 - не мерить запуск интерпретатора')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Файл для JSON-отчета')
+    parser.add_argument('--compare', help='JSON-отчет предыдущего прогона для сравнения')
+    args = parser.parse_args(argv)
+
+    names = [name for name in args.problems.split(',') if name]
+    unknown = [name for name in names if name not in CORPUS]
+    if unknown:
+        parser.error(f'Неизвестные задачи: {", ".join(unknown)}')
+
+    report = run_benchmark(args.mode, names, args.repeat, args.concurrency, args.scale, args.judge_mode,
+                           args.startup_samples, args.seed)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nСравнение с {args.compare} (коммит {baseline.get('meta', {}).get('commit')}):")
+        for line in compare_reports(baseline, report):
+            print(line)
+
+    if report['total']['unexpected_verdicts']:
+        print('Внимание: есть неожиданные вердикты', file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Добавляем путь к модулю app
+current_dir = os.path.dirname(os.path.abspath(__file__))
+service_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, service_dir)
+
+import app as compiler_app
+
+@pytest.fixture(autouse=True)
+def isolated_judge_state(monkeypatch, tmp_path):
+    """Состояние проверяющей системы на диске (входы тестов, сборки, чекеры, время тестов) - во временном каталоге теста"""
+    state_dir = tmp_path / 'judge_state'
+    monkeypatch.setattr(compiler_app, 'test_runtimes', compiler_app.TestRuntimeStats(str(state_dir / 'runtimes.json')))
+    monkeypatch.setattr(compiler_app, 'test_input_store', compiler_app.TestInputStore(str(state_dir / 'inputs'), compiler_app.TEST_INPUT_CACHE_BYTES))
+    monkeypatch.setattr(compiler_app, 'build_cache', compiler_app.BuildCache(str(state_dir / 'builds'), compiler_app.BUILD_CACHE_SIZE))
+    monkeypatch.setattr(compiler_app, 'CHECKER_DIR', str(state_dir / 'checkers'))
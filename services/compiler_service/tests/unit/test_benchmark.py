@@ -0,0 +1,35 @@
+import os
+import sys
+
+# Добавляем путь к модулю app
+current_dir = os.path.dirname(os.path.abspath(__file__))
+service_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, service_dir)
+
+import app as compiler_app
+import benchmark
+
+def test_percentile_interpolates():
+    """Тест перцентилей по замерам"""
+    values = [0.001 * i for i in range(1, 101)]
+    
+    assert benchmark.percentile([], 50) is None
+    assert benchmark.percentile([5], 99) == 5
+    assert abs(benchmark.percentile(values, 50) - 0.0505) < 1e-9
+    assert benchmark.latency_summary(values)['max'] == 100.0
+
+def test_benchmark_inprocess_report(monkeypatch):
+    """Тест короткого прогона бенчмарка в процессе"""
+    # run_benchmark подменяет get_problem и кэш вердиктов - вернем их после теста
+    monkeypatch.setattr(compiler_app, 'get_problem', compiler_app.get_problem)
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.verdict_cache)
+    
+    report = benchmark.run_benchmark('inprocess', ['trivial_io', 'big_output'], repeat=2, scale=0.1,
+                                     startup_samples=1)
+    
+    trivial = report['problems']['trivial_io']
+    assert trivial['tests'] == 4
+    assert trivial['verdicts'] == {'AC': 4}
+    assert trivial['test_latency_ms']['p50'] > 0
+    assert report['total']['unexpected_verdicts'] == 0
+    assert set(report['startup_ms']) == {'warm_pool', 'cold_template', 'bare_python'}
@@ -3,13 +3,16 @@ import subprocess
 import tempfile
 import os
 import sys
+import shutil
+import time
 
 # Добавляем путь к модулю app
 current_dir = os.path.dirname(os.path.abspath(__file__))
 service_dir = os.path.dirname(os.path.dirname(current_dir))
 sys.path.insert(0, service_dir)
 
-from app import run_python_code
+import app as compiler_app
+from app import run_python_code, run_test_cases, stage_python_submission, judge_test_case
 
 def test_run_python_code_success():
     """Тест успешного выполнения Python кода"""
@@ -45,3 +48,796 @@ def test_compile_python_syntax():
     except SyntaxError:
         assert False
 
+
+def test_run_test_cases_preserves_order():
+    """Тест параллельного запуска: details в исходном порядке тестов"""
+    code = "import time\nn = int(input())\ntime.sleep(0.05 * (3 - n))\nprint(n * 2)"
+    test_cases = [{'input': str(n), 'output': str(n * 2)} for n in range(4)]
+    staging_dir, program_path = stage_python_submission(code)
+    try:
+        results = run_test_cases(program_path, test_cases, max_parallel=4)
+    finally:
+        shutil.rmtree(staging_dir)
+    
+    assert [r['test_case'] for r in results] == [1, 2, 3, 4]
+    assert all(r['status'] == 'passed' for r in results)
+
+def test_run_test_cases_respects_parallel_cap(monkeypatch):
+    """Тест ограничения параллелизма одного сабмишена"""
+    import threading
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+    
+    def fake_judge(code, test_case, index, *args):
+        import time
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.02)
+        with lock:
+            state['running'] -= 1
+        return {'test_case': index + 1, 'status': 'passed'}
+    
+    monkeypatch.setattr(compiler_app, 'judge_test_case', fake_judge)
+    monkeypatch.setattr(compiler_app, 'JUDGE_WORKERS', 8)
+    monkeypatch.setattr(compiler_app, '_executor', None)
+    results = run_test_cases('', [{}] * 10, max_parallel=2)
+    
+    assert len(results) == 10
+    assert all(r['status'] == 'passed' for r in results)
+    assert state['peak'] <= 2
+
+@pytest.mark.skipif(not compiler_app.JUDGE_WARM_POOL, reason="Пул прогретых интерпретаторов недоступен")
+def test_warm_pool_isolates_tests():
+    """Тест изоляции: изменения модулей в одном тесте не видны в следующем"""
+    code = "import math\nprint(getattr(math, 'leak', 0))\nmath.leak = 1"
+    first = run_python_code(code, "")
+    second = run_python_code(code, "")
+    
+    assert first['stdout'].strip() == "0"
+    assert second['stdout'].strip() == "0"
+
+@pytest.mark.skipif(not compiler_app.JUDGE_WARM_POOL, reason="Пул прогретых интерпретаторов недоступен")
+def test_process_executor_after_warm_pool_started(monkeypatch):
+    """Тест: воркеры-процессы не делят с родителем сокеты уже запущенных шаблонов"""
+    warm_pool = compiler_app.WarmInterpreterPool(4, compiler_app.JUDGE_PRELOAD_MODULES)
+    monkeypatch.setattr(compiler_app, '_warm_pool', warm_pool)
+    monkeypatch.setattr(compiler_app, 'JUDGE_WORKERS', 4)
+    test_cases = [{'input': str(n), 'output': str(n + 1)} for n in range(60)]
+    staging_dir, program_path = stage_python_submission("print(int(input()) + 1)")
+    try:
+        # Все шаблоны запущены в родительском процессе
+        run_test_cases(program_path, test_cases, max_parallel=compiler_app.JUDGE_WORKERS)
+        assert compiler_app._warm_pool is not None
+        monkeypatch.setattr(compiler_app, 'JUDGE_EXECUTOR', 'process')
+        monkeypatch.setattr(compiler_app, '_executor', None)
+        results = run_test_cases(program_path, test_cases, max_parallel=compiler_app.JUDGE_WORKERS)
+        compiler_app._executor.shutdown()
+        # Шаблоны родителя продолжают работать
+        assert run_python_code("print(2)", "")['stdout'].strip() == "2"
+    finally:
+        warm_pool.shutdown()
+        shutil.rmtree(staging_dir)
+    
+    assert [r['verdict'] for r in results] == ['AC'] * 60
+
+@pytest.mark.skipif(not compiler_app.JUDGE_WARM_POOL, reason="Пул прогретых интерпретаторов недоступен")
+def test_warm_pool_child_does_not_see_service_modules():
+    """Тест: код участника не может импортировать модули сервиса из его рабочего каталога"""
+    staging_dir, program_path = stage_python_submission(
+        "import sys\nprint(sys.path[0])\nprint('' in sys.path)\ntry:\n    import worker\nexcept ImportError:\n    print('no worker')")
+    try:
+        result = compiler_app.run_program(program_path, '', 5, 256)
+    finally:
+        shutil.rmtree(staging_dir)
+    
+    assert result['stdout'].split('\n')[:3] == [staging_dir, 'False', 'no worker']
+
+@pytest.mark.skipif(not compiler_app.JUDGE_WARM_POOL, reason="Пул прогретых интерпретаторов недоступен")
+def test_warm_pool_timeout_and_exit_code():
+    """Тест таймаута и кода возврата в прогретом интерпретаторе"""
+    result = run_python_code("while True: pass", "", time_limit=0.5)
+    assert compiler_app.run_verdict(result, {'time_limit': 0.5, 'memory_limit': 256}) == 'TLE'
+    assert run_python_code("import sys\nsys.exit(3)", "")['returncode'] == 3
+
+def test_stage_python_submission_compiles_once():
+    """Тест подготовки сабмишена: один исходник и один .pyc на все тесты"""
+    staging_dir, program_path = stage_python_submission("print(input())")
+    try:
+        assert program_path.endswith('.pyc')
+        assert sorted(os.listdir(staging_dir)) == ['solution.py', 'solution.pyc']
+        results = run_test_cases(program_path, [{'input': 'a', 'output': 'a'}, {'input': 'b', 'output': 'b'}])
+        assert [r['status'] for r in results] == ['passed', 'passed']
+        assert sorted(os.listdir(staging_dir)) == ['solution.py', 'solution.pyc']
+    finally:
+        shutil.rmtree(staging_dir)
+
+def test_stage_python_submission_syntax_error():
+    """Тест: синтаксическая ошибка обнаруживается на этапе подготовки"""
+    import py_compile
+    with pytest.raises(py_compile.PyCompileError):
+        stage_python_submission("print('unclosed string")
+
+def test_run_test_cases_first_failure_cancels_running(monkeypatch):
+    """Тест режима first_failure: долгий тест прерывается, остальные пропускаются"""
+    import time
+    monkeypatch.setattr(compiler_app, 'JUDGE_WORKERS', 2)
+    monkeypatch.setattr(compiler_app, '_executor', None)
+    monkeypatch.setattr(compiler_app, '_warm_pool', None)
+    code = "import time\ns = input()\nif s == 'slow':\n    time.sleep(10)\nprint(s)"
+    test_cases = [
+        {'input': 'slow', 'output': 'slow'},
+        {'input': 'bad', 'output': 'good'},
+        {'input': 'ok', 'output': 'ok'},
+    ]
+    staging_dir, program_path = stage_python_submission(code)
+    try:
+        started = time.monotonic()
+        results = run_test_cases(program_path, test_cases, max_parallel=2, stop_on_failure=True)
+        elapsed = time.monotonic() - started
+    finally:
+        shutil.rmtree(staging_dir)
+    
+    assert [r['status'] for r in results] == ['skipped', 'failed', 'skipped']
+    assert elapsed < 5
+
+def test_compile_rejects_unknown_mode():
+    """Тест валидации параметра mode"""
+    client = compiler_app.app.test_client()
+    response = client.post('/compile', json={'code': 'print(1)', 'mode': 'fastest'})
+    
+    assert response.status_code == 400
+
+def test_judge_test_case_reports_resources():
+    """Тест: в details есть CPU-время, реальное время и пиковая память"""
+    staging_dir, program_path = stage_python_submission("print(input())")
+    try:
+        entry = judge_test_case(program_path, {'input': 'x', 'output': 'x'}, 0,
+                                limits={'time_limit': 1, 'memory_limit': 256})
+    finally:
+        shutil.rmtree(staging_dir)
+    
+    assert entry['verdict'] == 'AC'
+    assert entry['cpu_time'] >= 0
+    assert entry['wall_time'] > 0
+    assert 0 < entry['peak_rss_kb'] < 256 * 1024
+
+def test_judge_test_case_time_and_memory_limits():
+    """Тест вердиктов TLE и MLE по ограничениям задачи"""
+    limits = {'time_limit': 1, 'memory_limit': 64}
+    staging_dir, tle_path = stage_python_submission("while True: pass")
+    staging_dir2, mle_path = stage_python_submission("a = bytearray(200 * 1024 * 1024)")
+    try:
+        tle = judge_test_case(tle_path, {'input': '', 'output': ''}, 0, limits=limits)
+        mle = judge_test_case(mle_path, {'input': '', 'output': ''}, 0, limits=limits)
+    finally:
+        shutil.rmtree(staging_dir)
+        shutil.rmtree(staging_dir2)
+    
+    assert tle['status'] == 'error' and tle['verdict'] == 'TLE'
+    assert mle['status'] == 'error' and mle['verdict'] == 'MLE'
+
+def test_internal_error_is_not_blamed_on_program(monkeypatch):
+    """Тест: сбой запуска дает вердикт IE, а не RE, и не попадает в кэш вердиктов"""
+    class DeadPool:
+        def run(self, *args):
+            raise RuntimeError('Шаблонный интерпретатор завершился')
+    monkeypatch.setattr(compiler_app, 'get_warm_pool', lambda: DeadPool())
+    cache = compiler_app.LRUCache(16)
+    monkeypatch.setattr(compiler_app, 'verdict_cache', cache)
+    problem = {'test_cases': [{'input': '', 'output': '1'}]}
+    
+    result = compiler_app.judge_submission("print(1)", 'python', problem)
+    
+    assert result['details'][0]['verdict'] == 'IE'
+    assert 'Шаблонный' not in result['details'][0]['error']
+    assert len(cache) == 0
+
+def test_get_problem_limits_defaults():
+    """Тест ограничений задачи и значений по умолчанию"""
+    assert compiler_app.get_problem_limits({'time_limit': 2, 'memory_limit': 128}) == {
+        'time_limit': 2.0, 'memory_limit': 128
+    }
+    defaults = compiler_app.get_problem_limits(None)
+    assert defaults['time_limit'] == compiler_app.JUDGE_DEFAULT_TIME_LIMIT
+    assert defaults['memory_limit'] == compiler_app.JUDGE_DEFAULT_MEMORY_LIMIT
+
+def test_verdict_cache_returns_stored_verdict(monkeypatch):
+    """Тест кэша вердиктов: повторная отправка того же кода не запускает тесты"""
+    problem = {'problem_id': 'p1', 'test_cases': [{'input': '2', 'output': '4'}]}
+    calls = []
+    original = compiler_app.run_test_cases
+    
+    def counting_run_test_cases(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+    
+    monkeypatch.setattr(compiler_app, 'run_test_cases', counting_run_test_cases)
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(16))
+    
+    first = compiler_app.judge_submission("print(int(input()) * 2)", 'python', problem)
+    second = compiler_app.judge_submission("print(int(input()) * 2)\r\n\n", 'python', problem)
+    
+    assert first['status'] == 'success' and 'cached' not in first
+    assert second['status'] == 'success' and second['cached'] is True
+    assert len(calls) == 1
+    assert compiler_app.verdict_cache.stats()['hits'] == 1
+
+def test_verdict_cache_key_depends_on_test_set():
+    """Тест: изменение тестов задачи дает другой ключ кэша"""
+    problem = {'test_cases': [{'input': '1', 'output': '1'}]}
+    changed = {'test_cases': [{'input': '1', 'output': '2'}]}
+    
+    assert compiler_app.verdict_cache_key('print(1)', 'python', problem, 'all') != \
+        compiler_app.verdict_cache_key('print(1)', 'python', changed, 'all')
+
+def test_lru_cache_eviction():
+    """Тест вытеснения самой старой записи LRU-кэша"""
+    cache = compiler_app.LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, etag=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = {'ETag': etag} if etag else {}
+    
+    def json(self):
+        return self._payload
+
+def test_problem_cache_revalidates_with_etag(monkeypatch):
+    """Тест кэша задач: после TTL задача перепроверяется условным запросом"""
+    problem = {'problem_id': 'p1', 'test_cases': [{'input': '1', 'output': '1'}]}
+    requests_made = []
+    
+    def fake_get(url, headers=None, **kwargs):
+        requests_made.append(dict(headers or {}))
+        if (headers or {}).get('If-None-Match') == '"p1-1"':
+            return FakeResponse(304)
+        return FakeResponse(200, problem, etag='"p1-1"')
+    
+    monkeypatch.setattr(compiler_app.requests, 'get', fake_get)
+    monkeypatch.setattr(compiler_app, 'problems_cache', compiler_app.LRUCache(10))
+    monkeypatch.setattr(compiler_app, 'PROBLEM_CACHE_TTL', 0)
+    
+    assert compiler_app.get_problem('p1') == problem
+    assert compiler_app.get_problem('p1') == problem
+    assert requests_made == [{}, {'If-None-Match': '"p1-1"'}]
+
+def test_problem_cache_invalidation_endpoint(monkeypatch):
+    """Тест явного сброса задачи из кэша"""
+    monkeypatch.setattr(compiler_app, 'problems_cache', compiler_app.LRUCache(10))
+    compiler_app.problems_cache.set('p1', {'problem': {}, 'etag': None, 'checked_at': 0})
+    client = compiler_app.app.test_client()
+    
+    response = client.delete('/cache/problems/p1')
+    
+    assert response.status_code == 200
+    assert response.get_json()['invalidated'] is True
+    assert compiler_app.problems_cache.get('p1') is None
+
+def test_job_api_runs_submission(monkeypatch):
+    """Тест асинхронного задания: 202 сразу, вердикт - через GET /jobs/<id>"""
+    import time
+    problem = {'problem_id': 'p1', 'test_cases': [{'input': '3', 'output': '9'}]}
+    monkeypatch.setattr(compiler_app, 'get_problem', lambda problem_id: problem)
+    client = compiler_app.app.test_client()
+    
+    response = client.post('/jobs', json={'code': 'print(int(input()) ** 2)', 'problem_id': 'p1'})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    assert response.headers['Location'] == f'/jobs/{job_id}'
+    
+    for _ in range(100):
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if job['status'] in ('done', 'error'):
+            break
+        time.sleep(0.05)
+    
+    assert job['status'] == 'done'
+    assert job['progress'] == {'completed': 1, 'total': 1}
+    assert job['result']['status'] == 'success'
+    assert 'code' not in job
+
+def test_job_api_rejects_when_queue_full(monkeypatch):
+    """Тест обратного давления: при заполненной очереди - 429"""
+    import queue
+    full_queue = queue.Queue(maxsize=1)
+    full_queue.put_nowait({'job_id': 'busy'})
+    monkeypatch.setattr(compiler_app, 'job_queue', full_queue)
+    monkeypatch.setattr(compiler_app, 'JOB_WORKERS', 0)
+    monkeypatch.setattr(compiler_app, '_job_workers', [])
+    client = compiler_app.app.test_client()
+    
+    response = client.post('/jobs', json={'code': 'print(1)'})
+    
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
+    assert client.get('/jobs/unknown').status_code == 404
+
+@pytest.mark.parametrize('actual, expected, ok', [
+    ('8', '8', True),
+    ('\n  8 \n\n', '8\n', True),
+    ('1 2\n3', '1 2\n3', True),
+    ('1 2\n3', '1 2 3', False),
+    ('8 9', '8', False),
+    ('', '', True),
+    ('  ', '1', False),
+])
+def test_output_comparator_matches_strip_semantics(actual, expected, ok):
+    """Тест потокового сравнения: результат как у actual.strip() == expected.strip()"""
+    comparator = compiler_app.OutputComparator(expected)
+    data = actual.encode()
+    for i in range(len(data)):
+        comparator.feed(data[i:i + 1])
+    
+    assert comparator.finish() is ok
+
+def test_judge_test_case_output_limit(monkeypatch):
+    """Тест вердикта OLE при бесконечном выводе"""
+    monkeypatch.setattr(compiler_app, 'JUDGE_OUTPUT_LIMIT', 64 * 1024)
+    staging_dir, program_path = stage_python_submission("while True:\n    print(1)")
+    try:
+        entry = judge_test_case(program_path, {'input': '', 'output': '1'}, 0,
+                                limits={'time_limit': 5, 'memory_limit': 256})
+    finally:
+        shutil.rmtree(staging_dir)
+    
+    assert entry['status'] == 'error'
+    assert entry['verdict'] == 'OLE'
+
+def test_wrong_answer_previews_are_bounded():
+    """Тест: в details WA ожидаемый вывод обрезается так же, как фактический"""
+    limit = compiler_app.JUDGE_OUTPUT_PREVIEW
+    staging_dir, program_path = stage_python_submission("print('y' * %d)" % (limit * 3))
+    try:
+        entry = judge_test_case(program_path, {'input': '', 'output': 'x' * (limit * 3)}, 0,
+                                limits={'time_limit': 5, 'memory_limit': 256})
+    finally:
+        shutil.rmtree(staging_dir)
+    
+    assert entry['verdict'] == 'WA'
+    assert entry['expected'] == 'x' * limit and entry['expected_truncated']
+    assert entry['actual'] == 'y' * limit and entry['actual_truncated']
+
+def feed_in_chunks(comparator, text, size=3):
+    data = text.encode()
+    for i in range(0, len(data), size):
+        comparator.feed(data[i:i + size])
+    return comparator.finish()
+
+@pytest.mark.parametrize('checker, expected, actual, ok', [
+    ({'type': 'tokens'}, '1 2\n3', '1\n2   3\n', True),
+    ({'type': 'tokens'}, '1 2 3', '1 2', False),
+    ({'type': 'tokens'}, '10', '100', False),
+    ({'type': 'float', 'epsilon': 1e-3}, '0.3333 yes', '0.33331 yes', True),
+    ({'type': 'float', 'epsilon': 1e-6}, '0.3333', '0.3343', False),
+    ({'type': 'unordered_lines'}, 'a\nb\nb', 'b\na\nb\n', True),
+    ({'type': 'unordered_lines'}, 'a\nb', 'a\na', False),
+])
+def test_builtin_checkers(checker, expected, actual, ok):
+    """Тест встроенных чекеров на выводе, пришедшем кусками"""
+    comparator = compiler_app.make_comparator(checker, {'input': '', 'output': expected})
+    assert feed_in_chunks(comparator, actual) is ok
+
+def test_custom_checker_compiled_once(monkeypatch):
+    """Тест пользовательского чекера: компилируется один раз и вызывается на каждом тесте"""
+    monkeypatch.setattr(compiler_app, 'checker_cache', compiler_app.LRUCache(4))
+    source = (
+        "def check(input_data, expected_output, actual_output):\n"
+        "    a, b = map(int, actual_output.split())\n"
+        "    return a + b == int(input_data), 'sum ok'\n"
+    )
+    checker = {'type': 'custom', 'source': source}
+    staging_dir, program_path = stage_python_submission("n = int(input())\nprint(1, n - 1)")
+    try:
+        results = run_test_cases(program_path, [{'input': '5', 'output': ''}, {'input': '9', 'output': ''}],
+                                 checker=checker)
+    finally:
+        shutil.rmtree(staging_dir)
+    
+    assert [r['verdict'] for r in results] == ['AC', 'AC']
+    assert results[0]['checker_message'] == 'sum ok'
+    assert len(compiler_app.checker_cache) == 1
+
+def test_broken_custom_checker_reports_cf():
+    """Тест: ошибка в чекере дает вердикт CF, а не WA"""
+    checker = {'type': 'custom', 'source': 'def check(i, e, a):\n    return 1 / 0\n'}
+    staging_dir, program_path = stage_python_submission("print(1)")
+    try:
+        entry = judge_test_case(program_path, {'input': '', 'output': '1'}, 0, checker=checker)
+    finally:
+        shutil.rmtree(staging_dir)
+    
+    assert entry['status'] == 'error'
+    assert entry['verdict'] == 'CF'
+
+def test_hanging_custom_checker_reports_cf(monkeypatch, tmp_path):
+    """Тест: зависший чекер прерывается по ограничению времени и дает CF"""
+    monkeypatch.setattr(compiler_app, 'CHECKER_DIR', str(tmp_path))
+    monkeypatch.setattr(compiler_app, 'CHECKER_TIME_LIMIT', 1)
+    checker = {'type': 'custom', 'source': 'def check(i, e, a):\n    while True:\n        pass\n'}
+    staging_dir, program_path = stage_python_submission("print(1)")
+    try:
+        started = time.monotonic()
+        entry = judge_test_case(program_path, {'input': '', 'output': '1'}, 0, checker=checker)
+    finally:
+        shutil.rmtree(staging_dir)
+    
+    assert time.monotonic() - started < 10
+    assert entry['verdict'] == 'CF'
+    assert 'времени' in entry['error']
+
+requires_gcc = pytest.mark.skipif(shutil.which('gcc') is None or shutil.which('g++') is None,
+                                  reason='Нет gcc/g++')
+
+@requires_gcc
+def test_judge_c_and_cpp_submissions(monkeypatch, tmp_path):
+    """Тест проверки C и C++: сборка один раз на сабмишен и запуск на всех тестах"""
+    monkeypatch.setattr(compiler_app, 'build_cache', compiler_app.BuildCache(str(tmp_path), 8))
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(16))
+    problem = {'test_cases': [{'input': '2 3', 'output': '5'}, {'input': '10 -4', 'output': '6'}]}
+    c_code = '#include <stdio.h>\nint main(){int a,b;scanf("%d %d",&a,&b);printf("%d\\n",a+b);return 0;}\n'
+    cpp_code = '#include <iostream>\nint main(){long long a,b;std::cin>>a>>b;std::cout<<a+b<<"\\n";}\n'
+    
+    c_result = compiler_app.judge_submission(c_code, 'c', problem)
+    cpp_result = compiler_app.judge_submission(cpp_code, 'c++', problem)
+    
+    for result in (c_result, cpp_result):
+        assert result['status'] == 'success'
+        assert [r['verdict'] for r in result['details']] == ['AC', 'AC']
+        assert result['compile_cached'] is False and result['compile_time'] > 0
+    assert compiler_app.build_cache.stats()['misses'] == 2
+
+@requires_gcc
+def test_build_cache_skips_recompilation(monkeypatch, tmp_path):
+    """Тест кэша сборок: тот же исходник с теми же флагами не компилируется повторно"""
+    cache = compiler_app.BuildCache(str(tmp_path), 1)
+    monkeypatch.setattr(compiler_app, 'build_cache', cache)
+    code = 'int main(){return 0;}\n'
+    
+    first_path, first_time, first_cached = cache.get_or_build(code, 'c')
+    second_path, second_time, second_cached = cache.get_or_build(code, 'c')
+    
+    assert first_path == second_path
+    assert not first_cached and second_cached and second_time == 0
+    # Другой язык - другие флаги и другой ключ; лишний бинарник вытесняется
+    cache.get_or_build(code, 'cpp')
+    assert cache.key(code, 'c') != cache.key(code, 'cpp')
+    assert cache.stats()['size'] == 1
+
+@requires_gcc
+def test_c_compilation_error_and_runtime_error(monkeypatch, tmp_path):
+    """Тест вердиктов CE и RE для C"""
+    monkeypatch.setattr(compiler_app, 'build_cache', compiler_app.BuildCache(str(tmp_path), 8))
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(16))
+    problem = {'test_cases': [{'input': '', 'output': ''}]}
+    
+    ce = compiler_app.judge_submission('int main(){ return x; }', 'c', problem)
+    re = compiler_app.judge_submission('int main(){ int *p = 0; return *p; }', 'c', problem)
+    
+    assert ce['details'][0]['verdict'] == 'CE'
+    assert 'solution.c' in ce['details'][0]['error'] and str(tmp_path) not in ce['details'][0]['error']
+    assert re['details'][0]['verdict'] == 'RE'
+    assert 'SIGSEGV' in re['details'][0]['error']
+
+def test_compile_timeout_is_not_cached(monkeypatch, tmp_path):
+    """Тест: CE из-за таймаута компиляции зависит от нагрузки и не кэшируется"""
+    monkeypatch.setattr(compiler_app, 'build_cache', compiler_app.BuildCache(str(tmp_path), 8))
+    cache = compiler_app.LRUCache(16)
+    monkeypatch.setattr(compiler_app, 'verdict_cache', cache)
+    def slow_compiler(command, **kwargs):
+        raise subprocess.TimeoutExpired(command, kwargs.get('timeout'))
+    monkeypatch.setattr(compiler_app.subprocess, 'run', slow_compiler)
+    
+    result = compiler_app.judge_submission('int main(){ return 0; }', 'c', {'test_cases': [{'input': '', 'output': ''}]})
+    
+    assert result['details'][0]['verdict'] == 'CE'
+    assert len(cache) == 0
+
+def test_compile_rejects_unsupported_language():
+    """Тест: неизвестный язык - ошибка, а не пустой результат"""
+    client = compiler_app.app.test_client()
+    response = client.post('/compile', json={'code': 'x', 'language': 'brainfuck'})
+    
+    assert response.status_code == 400
+    assert compiler_app.judge_submission('x', 'brainfuck', None)['status'] == 'error'
+
+def test_concurrent_identical_submissions_are_coalesced(monkeypatch):
+    """Тест single-flight: одновременные одинаковые сабмишены проверяются один раз"""
+    import threading
+    import time
+    problem = {'problem_id': 'p1', 'test_cases': [{'input': '', 'output': '1'}]}
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    
+    def slow_run_test_cases(*args, **kwargs):
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return [{'test_case': 1, 'status': 'passed', 'verdict': 'AC'}]
+    
+    monkeypatch.setattr(compiler_app, 'run_test_cases', slow_run_test_cases)
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(0))
+    monkeypatch.setattr(compiler_app, 'in_flight', compiler_app.SingleFlight())
+    
+    responses = []
+    def submit():
+        responses.append(compiler_app.judge_submission("print(1)", 'python', problem))
+    
+    threads = [threading.Thread(target=submit) for _ in range(3)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while compiler_app.in_flight.stats()['coalesced'] < 2:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    
+    assert len(calls) == 1
+    assert sorted(r.get('coalesced', False) for r in responses) == [False, True, True]
+    assert all(r['status'] == 'success' for r in responses)
+    assert compiler_app.in_flight.stats()['in_flight'] == 0
+
+def test_metrics_endpoint_exposes_judge_metrics(monkeypatch):
+    """Тест /metrics: вердикты, время тестов и доля попаданий в кэши"""
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(16))
+    problem = {'test_cases': [{'input': '1', 'output': '1'}, {'input': '2', 'output': '3'}]}
+    compiler_app.judge_submission("print(input())", 'python', problem)
+    
+    response = compiler_app.app.test_client().get('/metrics')
+    body = response.get_data(as_text=True)
+    
+    assert response.status_code == 200
+    assert 'judge_verdicts_total{verdict="AC"}' in body
+    assert 'judge_verdicts_total{verdict="WA"}' in body
+    for name in ('judge_test_run_seconds_bucket', 'judge_queue_wait_seconds_bucket{le="0.001",queue="tests"}',
+                 'judge_sandbox_startup_seconds_count', 'judge_comparison_seconds_count',
+                 'judge_tests_in_flight', 'judge_pool_utilization', 'judge_cache_hit_ratio{cache="problem"}'):
+        assert name in body
+
+def test_test_inputs_are_shared_files(monkeypatch, tmp_path):
+    """Тест: вход теста пишется на диск один раз и передается программе как stdin"""
+    store = compiler_app.TestInputStore(str(tmp_path), 1024 * 1024)
+    monkeypatch.setattr(compiler_app, 'test_input_store', store)
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(0))
+    big_input = '1\n' * 100000
+    problem = {'test_cases': [{'input': big_input, 'output': '100000'}] * 4}
+    code = "import sys\nprint(sum(map(int, sys.stdin.buffer.read().split())))"
+    
+    result = compiler_app.judge_submission(code, 'python', problem)
+    
+    assert result['status'] == 'success'
+    assert os.listdir(tmp_path) == [compiler_app.input_digest(big_input)]
+    assert problem['_input_digests'] == [compiler_app.input_digest(big_input)] * 4
+    
+    # Старые файлы вытесняются при превышении лимита размера
+    small = compiler_app.TestInputStore(str(tmp_path), 300000)
+    small.open('x' * 200000).close()
+    assert os.listdir(tmp_path) == [compiler_app.input_digest('x' * 200000)]
+
+def test_test_input_larger_than_store_limit(monkeypatch, tmp_path):
+    """Тест: вход больше лимита хранилища не вытесняется до запуска программы"""
+    monkeypatch.setattr(compiler_app, 'test_input_store', compiler_app.TestInputStore(str(tmp_path), 10))
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(0))
+    problem = {'test_cases': [{'input': '1 2 3 4 5 6 7', 'output': '28'}] * 2}
+    code = "print(sum(map(int, input().split())))"
+    
+    result = compiler_app.judge_submission(code, 'python', problem)
+    
+    assert [r['verdict'] for r in result['details']] == ['AC', 'AC']
+
+def test_test_groups_skip_dependents_of_failed_group(monkeypatch, tmp_path):
+    """Тест подзадач: группа, зависящая от непройденной, не запускается"""
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(0))
+    # Решение верно только для n < 10
+    code = "n = int(input())\nprint(n * 2 if n < 10 else 0)"
+    problem = {
+        'test_cases': [
+            {'input': '1', 'output': '2'},
+            {'input': '2', 'output': '4'},
+            {'input': '50', 'output': '100'},
+            {'input': '60', 'output': '120'},
+            {'input': '3', 'output': '6'},
+            {'input': '70', 'output': '140'}
+        ],
+        'test_groups': [
+            {'id': 1, 'points': 30, 'tests': [1, 2]},
+            {'id': 2, 'points': 30, 'tests': [3, 4]},
+            {'id': 3, 'points': 40, 'tests': [5, 6], 'depends_on': [1, 2]}
+        ]
+    }
+    calls = []
+    original = compiler_app.judge_test_case
+    
+    def counting_judge_test_case(*args):
+        calls.append(args[1]['input'])
+        return original(*args)
+    
+    monkeypatch.setattr(compiler_app, 'judge_test_case', counting_judge_test_case)
+    monkeypatch.setattr(compiler_app, 'JUDGE_MAX_PARALLEL_PER_SUBMISSION', 1)
+    
+    result = compiler_app.judge_submission(code, 'python', problem)
+    
+    assert result['score'] == 30 and result['max_score'] == 100
+    assert [g['status'] for g in result['groups']] == ['passed', 'failed', 'skipped']
+    assert result['groups'][2]['failed_dependencies'] == [2]
+    # Во второй группе после первого WA тест 4 не запускается, группа 3 не запускается вовсе
+    assert sorted(calls) == ['1', '2', '50']
+    assert [d['status'] for d in result['details']] == ['passed', 'passed', 'failed', 'skipped', 'skipped',
+                                                        'skipped']
+    assert [d['group'] for d in result['details']] == [1, 1, 2, 2, 3, 3]
+
+def test_ungrouped_tests_and_empty_groups(monkeypatch, tmp_path):
+    """Тест: в режиме all тесты вне групп проверяются все, группа без тестов не дает баллов"""
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(0))
+    code = "n = int(input())\nprint(n * 2 if n < 10 else 0)"
+    problem = {
+        'test_cases': [
+            {'input': '1', 'output': '2'},
+            {'input': '50', 'output': '100'},
+            {'input': '2', 'output': '4'},
+            {'input': '3', 'output': '6'}
+        ],
+        'test_groups': [
+            {'id': 1, 'points': 50, 'tests': [1]},
+            {'id': 2, 'points': 50, 'tests': []}
+        ]
+    }
+    
+    result = compiler_app.judge_submission(code, 'python', problem)
+    
+    assert [d['status'] for d in result['details']] == ['passed', 'failed', 'passed', 'passed']
+    assert [g['status'] for g in result['groups']] == ['passed', 'failed']
+    assert result['score'] == 50
+
+def test_runtime_stats_ewma_and_persistence(tmp_path):
+    """Тест истории времени тестов: скользящее среднее, порядок LPT и сохранение в файл"""
+    path = str(tmp_path / 'runtimes.json')
+    stats = compiler_app.TestRuntimeStats(path, alpha=0.5)
+    stats.record('p1', 0, 0.1)
+    stats.record('p1', 1, 0.4)
+    stats.record('p1', 1, 0.8)
+    
+    assert stats.estimates('p1', [0, 1, 2]) == [0.1, pytest.approx(0.6), None]
+    # Тест без замеров идет первым, затем самый долгий
+    assert stats.lpt_order('p1', [0, 1, 2]) == [2, 1, 0]
+    
+    stats.save()
+    restored = compiler_app.TestRuntimeStats(path)
+    assert restored.estimates('p1', [0, 1]) == [0.1, pytest.approx(0.6)]
+
+def test_run_test_cases_starts_slowest_tests_first(monkeypatch, tmp_path):
+    """Тест планирования: исторически самые долгие тесты запускаются первыми"""
+    stats = compiler_app.TestRuntimeStats(str(tmp_path / 'runtimes.json'))
+    for index, seconds in enumerate([0.01, 0.5, 0.02, 0.3]):
+        stats.record('p1', index, seconds)
+    monkeypatch.setattr(compiler_app, 'test_runtimes', stats)
+    started = []
+    
+    def fake_judge(program_path, test_case, index, *args):
+        started.append(index)
+        return {'test_case': index + 1, 'status': 'passed', 'wall_time': 0.1}
+    
+    monkeypatch.setattr(compiler_app, 'judge_test_case', fake_judge)
+    results = run_test_cases('', [{}] * 4, max_parallel=1, runtime_key='p1')
+    
+    assert started == [1, 3, 2, 0]
+    assert [r['test_case'] for r in results] == [1, 2, 3, 4]
+    assert stats.estimates('p1', [0])[0] == pytest.approx(0.01 + 0.3 * (0.1 - 0.01))
+
+def test_compile_batch_streams_ndjson(monkeypatch):
+    """Тест пакетной проверки: задача загружается один раз, результаты идут строками NDJSON"""
+    import json
+    problem = {'problem_id': 'p1', 'test_cases': [{'input': '2', 'output': '4'}, {'input': '5', 'output': '10'}]}
+    loads = []
+    
+    def fake_get_problem(problem_id):
+        loads.append(problem_id)
+        return problem
+    
+    monkeypatch.setattr(compiler_app, 'get_problem', fake_get_problem)
+    monkeypatch.setattr(compiler_app, 'verdict_cache', compiler_app.LRUCache(0))
+    submissions = [
+        {'submission_id': 's1', 'code': 'print(int(input()) * 2)'},
+        {'submission_id': 's2', 'code': 'print(int(input()) + 2)'},
+        {'submission_id': 's3', 'code': ''}
+    ]
+    
+    client = compiler_app.app.test_client()
+    response = client.post('/compile/batch', json={'problem_id': 'p1', 'submissions': submissions})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert loads == ['p1']
+    by_id = {line['submission_id']: line for line in lines[:-1]}
+    assert by_id['s1']['status'] == 'success'
+    assert by_id['s2']['status'] == 'partial'
+    assert by_id['s3']['status'] == 'error'
+    assert lines[-1]['done'] is True and lines[-1]['total'] == 3
+
+def test_compile_batch_validation(monkeypatch):
+    """Тест валидации пакетной проверки"""
+    monkeypatch.setattr(compiler_app, 'get_problem', lambda problem_id: None)
+    client = compiler_app.app.test_client()
+    
+    assert client.post('/compile/batch', json={'problem_id': 'p1', 'submissions': []}).status_code == 400
+    assert client.post('/compile/batch', json={'submissions': [{'code': 'x'}]}).status_code == 400
+    assert client.post('/compile/batch', json={'problem_id': 'p1', 'submissions': [{'code': 'x'}]}).status_code == 404
+
+def test_syntax_check_is_isolated_and_cached(monkeypatch):
+    """Тест проверки синтаксиса без тестов: вне процесса сервиса и с кэшем по хэшу исходника"""
+    monkeypatch.setattr(compiler_app, 'syntax_cache', compiler_app.LRUCache(16))
+    calls = []
+    original = compiler_app.run_program
+    
+    def counting_run_program(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+    
+    monkeypatch.setattr(compiler_app, 'run_program', counting_run_program)
+    
+    ok = compiler_app.judge_submission("print(1)", 'python', None)
+    ok_again = compiler_app.judge_submission("print(1)", 'python', None)
+    broken = compiler_app.judge_submission("print(1", 'python', None)
+    
+    assert ok['status'] == 'success' and ok_again['status'] == 'success'
+    assert broken['status'] == 'error' and 'Синтаксическая ошибка' in broken['result']
+    assert len(calls) == 2
+    assert compiler_app.syntax_cache.stats()['hits'] == 1
+
+@pytest.mark.parametrize('run_result', [
+    {'stdout': '', 'stderr': '/srv/judge socket died', 'returncode': -1, 'internal_error': True},
+    {'stdout': '', 'stderr': '', 'returncode': -9, 'timed_out': True},
+    {'stdout': '', 'stderr': 'MemoryError', 'returncode': 1},
+])
+def test_failed_syntax_check_is_internal_error(monkeypatch, run_result):
+    """Сбой или превышение ограничений у чекера синтаксиса - не синтаксическая ошибка и не кэшируется"""
+    monkeypatch.setattr(compiler_app, 'syntax_cache', compiler_app.LRUCache(16))
+    monkeypatch.setattr(compiler_app, 'run_program', lambda *args, **kwargs: dict(run_result))
+    
+    result = compiler_app.judge_submission("print(1)", 'python', None)
+    
+    assert result == {'status': 'error', 'result': 'Внутренняя ошибка проверяющей системы'}
+    assert len(compiler_app.syntax_cache) == 0
+
+def test_compile_rejects_oversized_source(monkeypatch):
+    """Тест ограничения размера исходника"""
+    monkeypatch.setattr(compiler_app, 'JUDGE_MAX_SOURCE_SIZE', 100)
+    client = compiler_app.app.test_client()
+    
+    response = client.post('/compile', json={'code': 'x = 1\n' * 50})
+    
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('data, error', [
+    ({}, 'Код отсутствует'),
+    ({'code': 123}, 'Код отсутствует'),
+    ({'code': 'print(1)', 'mode': 'fastest'}, 'Неизвестный режим: fastest'),
+    ({'code': 'print(1)', 'language': 'cobol'}, 'Неподдерживаемый язык: cobol'),
+    ({'code': 'x = 1\n' * 50}, 'Исходник больше 100 байт'),
+])
+def test_judge_request_validation_is_shared(monkeypatch, data, error):
+    """Тест: /compile, /jobs и judge_submission отклоняют запрос одинаково"""
+    monkeypatch.setattr(compiler_app, 'JUDGE_MAX_SOURCE_SIZE', 100)
+    client = compiler_app.app.test_client()
+    
+    assert compiler_app.validate_judge_request(data) == error
+    for url in ('/compile', '/jobs'):
+        response = client.post(url, json=data)
+        assert response.status_code == 400
+        assert response.get_json()['result'] == error
+    if isinstance(data.get('code'), str):
+        result = compiler_app.judge_submission(data['code'], data.get('language'), None, data.get('mode', 'all'))
+        assert result == {'status': 'error', 'result': error}
@@ -0,0 +1,119 @@
+import pytest
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+# Добавляем путь к модулю worker
+current_dir = os.path.dirname(os.path.abspath(__file__))
+service_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, service_dir)
+
+import worker
+from worker import JudgeWorker, parse_message, process_message
+
+class InMemoryChannel:
+    """Заглушка канала RabbitMQ: хранит очередь, публикации и подтверждения в памяти"""
+    
+    def __init__(self):
+        self.queues = {}
+        self.exchanges = {}
+        self.published = []
+        self.acked = []
+        self.nacked = []
+        self.prefetch = None
+        self.consumer = None
+    
+    def queue_declare(self, queue, durable=False):
+        self.queues[queue] = durable
+    
+    def exchange_declare(self, exchange, exchange_type, durable=False):
+        self.exchanges[exchange] = exchange_type
+    
+    def basic_qos(self, prefetch_count):
+        self.prefetch = prefetch_count
+    
+    def basic_consume(self, queue, on_message_callback):
+        self.consumer = on_message_callback
+    
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((exchange, json.loads(body), properties))
+    
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+    
+    def basic_nack(self, delivery_tag, requeue=True):
+        self.nacked.append(delivery_tag)
+    
+    def deliver(self, delivery_tag, body, correlation_id=None):
+        self.consumer(self, SimpleNamespace(delivery_tag=delivery_tag),
+                      SimpleNamespace(correlation_id=correlation_id), body)
+
+@pytest.fixture
+def judge_worker():
+    channel = InMemoryChannel()
+    judge = JudgeWorker(channel, schedule=lambda callback: callback(), prefetch=2)
+    judge.setup()
+    yield judge
+    judge.shutdown()
+
+def test_worker_declares_durable_queue(judge_worker):
+    """Тест: очередь запросов устойчивая, prefetch ограничивает параллелизм"""
+    channel = judge_worker.channel
+    assert channel.queues[worker.JUDGE_REQUEST_QUEUE] is True
+    assert channel.exchanges[worker.JUDGE_RESULT_EXCHANGE] == 'fanout'
+    # Очередь вердиктов объявляет их потребитель, а не воркер
+    assert list(channel.queues) == [worker.JUDGE_REQUEST_QUEUE]
+    assert channel.prefetch == 2
+
+def test_worker_publishes_verdict_then_acks(judge_worker, monkeypatch):
+    """Тест: вердикт публикуется в обменник результатов, затем сообщение подтверждается"""
+    problem = {'problem_id': 'p1', 'test_cases': [{'input': '1 2', 'output': '3'}]}
+    monkeypatch.setattr(worker, 'get_problem', lambda problem_id: problem)
+    body = json.dumps({
+        'submission_id': 'sub_1',
+        'code': 'print(sum(map(int, input().split())))',
+        'problem_id': 'p1'
+    }).encode()
+    
+    judge_worker.channel.deliver(7, body, correlation_id='corr-1')
+    judge_worker.executor.shutdown(wait=True)
+    
+    exchange, result, properties = judge_worker.channel.published[0]
+    assert exchange == worker.JUDGE_RESULT_EXCHANGE
+    assert result['submission_id'] == 'sub_1'
+    assert result['status'] == 'success'
+    assert properties.correlation_id == 'corr-1'
+    assert judge_worker.channel.acked == [7]
+
+def test_worker_rejects_malformed_message(judge_worker):
+    """Тест: некорректное сообщение отклоняется без повторной постановки"""
+    judge_worker.channel.deliver(3, b'not json')
+    judge_worker.executor.shutdown(wait=True)
+    
+    assert judge_worker.channel.nacked == [3]
+    assert judge_worker.channel.published == []
+
+def test_worker_publishes_error_when_judging_fails(judge_worker, monkeypatch):
+    """Тест: ValueError при проверке (например, нечисловой time_limit задачи) - вердикт error, а не отброшенное сообщение"""
+    problem = {'problem_id': 'p1', 'time_limit': 'fast', 'test_cases': [{'input': '', 'output': '1'}]}
+    monkeypatch.setattr(worker, 'get_problem', lambda problem_id: problem)
+    body = json.dumps({'submission_id': 'sub_3', 'code': 'print(1)', 'problem_id': 'p1'}).encode()
+    
+    judge_worker.channel.deliver(5, body)
+    judge_worker.executor.shutdown(wait=True)
+    
+    _, result, _ = judge_worker.channel.published[0]
+    assert result == {'status': 'error', 'result': 'Внутренняя ошибка проверяющей системы', 'submission_id': 'sub_3'}
+    assert judge_worker.channel.nacked == []
+    assert judge_worker.channel.acked == [5]
+
+def test_parse_message_rejects_non_object():
+    """Тест: тело, не являющееся JSON-объектом, считается некорректным"""
+    with pytest.raises(ValueError):
+        parse_message(b'[1, 2]')
+
+def test_process_message_without_code():
+    """Тест: запрос без кода дает вердикт error"""
+    result = process_message({'submission_id': 'sub_2'})
+    assert result == {'status': 'error', 'result': 'Код отсутствует', 'submission_id': 'sub_2'}
@@ -1,6 +1,17 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import requests
 import os
+import json
+import logging
+import queue
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from flasgger import Swagger, swag_from
 
@@ -10,6 +21,37 @@ AUTH_SERVICE_URL = os.getenv('AUTH_SERVICE_URL', 'http://auth_service:5001')
 COMPILER_SERVICE_URL = os.getenv('COMPILER_SERVICE_URL', 'http://compiler_service:5005')
 ADMIN_SERVICE_URL = os.getenv('ADMIN_SERVICE_URL', 'http://admin_service:5003')
 
+# Сколько сабмишенов одновременно ждут вердикта от compiler_service
+JUDGE_DISPATCH_WORKERS = int(os.getenv('JUDGE_DISPATCH_WORKERS', '8'))
+# Сколько секунд ждать ответа compiler_service на один сабмишн
+JUDGE_REQUEST_TIMEOUT = float(os.getenv('JUDGE_REQUEST_TIMEOUT', '300'))
+# Через сколько секунд клиенту стоит повторить запрос статуса (Retry-After)
+POLL_RETRY_AFTER = 1
+# Максимальное ожидание вердикта в long-poll (GET /submissions/<id>?wait=N)
+MAX_POLL_WAIT = int(os.getenv('MAX_POLL_WAIT', '30'))
+# Как часто SSE-поток шлет комментарий-keepalive, пока вердикта нет
+SSE_KEEPALIVE_INTERVAL = float(os.getenv('SSE_KEEPALIVE_INTERVAL', '15'))
+# Размер страницы списков сабмишенов по умолчанию и максимальный
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '200'))
+
+SUBMISSION_FIELDS = ('submission_id', 'user_id', 'problem_id', 'code', 'language', 'status', 'result', 'created_at', 'judged_at')
+# Код - самое тяжелое поле, в списках он отдается только по явному fields=code
+DEFAULT_LISTING_FIELDS = tuple(field for field in SUBMISSION_FIELDS if field != 'code')
+
+# Файл базы сабмишенов (SQLite в режиме WAL)
+SUBMISSION_DB_PATH = os.getenv('SUBMISSION_DB_PATH', os.path.join(tempfile.gettempdir(), 'submissions.db'))
+# Сколько сабмишенов держать в кэше чтения
+SUBMISSION_CACHE_SIZE = int(os.getenv('SUBMISSION_CACHE_SIZE', '10000'))
+# Максимум операций записи в одной транзакции group commit
+STORE_BATCH_SIZE = int(os.getenv('STORE_BATCH_SIZE', '256'))
+# Сколько номеров сабмишенов процесс резервирует в базе за раз
+ID_BLOCK_SIZE = int(os.getenv('ID_BLOCK_SIZE', '100'))
+# Как часто ожидающий вердикта перечитывает базу: вердикт могла записать другая реплика
+STORE_POLL_INTERVAL = float(os.getenv('STORE_POLL_INTERVAL', '1'))
+
+logger = logging.getLogger('submission_service')
+
 # Настройка Swagger
 swagger_config = {
     "headers": [],
@@ -43,8 +85,333 @@ swagger_template = {
 
 swagger = Swagger(app, config=swagger_config, template=swagger_template)
 
-# Простая база данных в памяти
-submissions = {}
+class LRUCache:
+    """Потокобезопасный LRU-кэш с ограничением по числу записей и счетчиками попаданий"""
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+    
+    def peek(self, key, default=None):
+        """Значение без обновления порядка и счетчиков"""
+        with self._lock:
+            return self._data.get(key, default)
+    
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def __len__(self):
+        return len(self._data)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    seq INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    problem_id TEXT NOT NULL,
+    code TEXT NOT NULL,
+    language TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    created_at TEXT NOT NULL,
+    judged_at TEXT
+);
+CREATE INDEX IF NOT EXISTS submissions_user ON submissions (user_id, created_at);
+CREATE INDEX IF NOT EXISTS submissions_problem ON submissions (problem_id, created_at);
+CREATE INDEX IF NOT EXISTS submissions_status ON submissions (status, created_at);
+CREATE INDEX IF NOT EXISTS submissions_created ON submissions (created_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Выражения для полей сабмишена в SELECT: submission_id не хранится, а выводится из seq
+FIELD_COLUMNS = {field: field for field in SUBMISSION_FIELDS}
+FIELD_COLUMNS['submission_id'] = "'sub_' || seq AS submission_id"
+
+def submission_seq(submission_id):
+    """Порядковый номер сабмишена: sub_1 -> 1. ValueError для чужого формата"""
+    prefix, _, number = submission_id.partition('_')
+    if prefix != 'sub' or not number.isdigit():
+        raise ValueError(f'Некорректный id сабмишена: {submission_id}')
+    return int(number)
+
+class SubmissionStore:
+    """
+    Хранилище сабмишенов в SQLite (WAL). Читатели берут соединения из пула и
+    не блокируют запись. Вставки и обновления статуса проходят через один
+    поток-писатель: все накопившиеся за время предыдущего коммита операции
+    фиксируются одной транзакцией (group commit), а вызывающий ждет коммита
+    своей операции. Сабмишены с вердиктом и те, что проверяет этот процесс,
+    лежат в LRU-кэше; pending-сабмишены чужих реплик не кэшируются, потому
+    что их вердикт запишет другой процесс.
+    """
+    
+    def __init__(self, path, cache_size=SUBMISSION_CACHE_SIZE, batch_size=STORE_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.cache = LRUCache(cache_size)
+        self._readers = queue.LifoQueue()
+        self._writes = queue.Queue()
+        self._seq_lock = threading.Lock()
+        self._next_seq = self._seq_limit = 0
+        with self._reader() as conn:
+            conn.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, name='submission-writer', daemon=True)
+        self._writer.start()
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        # В WAL-режиме NORMAL не теряет данных при падении процесса, только при отказе питания
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+    
+    @contextmanager
+    def _reader(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+    
+    def _allocate_seq(self):
+        """
+        Номер нового сабмишена. Номера резервируются в базе блоками по
+        ID_BLOCK_SIZE, поэтому реплики на одном файле не выдают одинаковых id
+        """
+        with self._seq_lock:
+            if self._next_seq >= self._seq_limit:
+                with self._reader() as conn:
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('submission_seq', 0)")
+                        conn.execute("UPDATE counters SET value = value + ? WHERE name = 'submission_seq'", (ID_BLOCK_SIZE,))
+                        limit = conn.execute("SELECT value FROM counters WHERE name = 'submission_seq'").fetchone()[0]
+                        conn.execute('COMMIT')
+                    except Exception:
+                        conn.execute('ROLLBACK')
+                        raise
+                self._next_seq, self._seq_limit = limit - ID_BLOCK_SIZE, limit
+            self._next_seq += 1
+            return self._next_seq
+    
+    def _write(self, sql, params):
+        """Ставит запись в очередь писателя и ждет коммита ее пакета"""
+        done = Future()
+        self._writes.put((sql, params, done))
+        done.result()
+    
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._writes.get()]
+            if batch[0] is None:
+                break
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._writes.put(None)
+                    break
+                batch.append(item)
+            self._commit(conn, batch)
+        conn.close()
+    
+    def _commit(self, conn, batch):
+        try:
+            conn.execute('BEGIN')
+            for sql, params, _ in batch:
+                conn.execute(sql, params)
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            if len(batch) > 1:
+                # Одна неудачная операция не должна ронять весь пакет
+                for item in batch:
+                    self._commit(conn, [item])
+                return
+            batch[0][2].set_exception(sys.exc_info()[1])
+            return
+        for _, _, done in batch:
+            done.set_result(None)
+    
+    def add(self, submission):
+        """Сохраняет новый сабмишн, назначает ему submission_id и created_at"""
+        seq = self._allocate_seq()
+        submission['submission_id'] = f'sub_{seq}'
+        submission['created_at'] = datetime.now().isoformat(timespec='microseconds')
+        submission.setdefault('judged_at', None)
+        self._write(
+            'INSERT INTO submissions (seq, user_id, problem_id, code, language, status, result, created_at, judged_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (seq, submission['user_id'], submission['problem_id'], submission['code'], submission['language'],
+             submission['status'], submission['result'], submission['created_at'], submission['judged_at'])
+        )
+        self.cache.set(submission['submission_id'], submission)
+        return submission['submission_id']
+    
+    def update(self, submission_id, **fields):
+        """Обновляет поля сабмишена. Кэш меняется только после коммита"""
+        assignments = ', '.join(f'{field} = ?' for field in fields)
+        self._write(f'UPDATE submissions SET {assignments} WHERE seq = ?', (*fields.values(), submission_seq(submission_id)))
+        cached = self.cache.peek(submission_id)
+        if cached is not None:
+            # Кэшированный словарь не меняем на месте: его может сериализовать другой поток
+            self.cache.set(submission_id, dict(cached, **fields))
+    
+    def get(self, submission_id):
+        """Сабмишн по id или None"""
+        submission = self.cache.get(submission_id)
+        if submission is not None:
+            return submission
+        try:
+            seq = submission_seq(submission_id)
+        except ValueError:
+            return None
+        columns = ', '.join(FIELD_COLUMNS.values())
+        with self._reader() as conn:
+            row = conn.execute(f'SELECT {columns} FROM submissions WHERE seq = ?', (seq,)).fetchone()
+        if row is None:
+            return None
+        submission = dict(row)
+        if submission['status'] != 'pending':
+            self.cache.set(submission_id, submission)
+        return submission
+    
+    def cached_status(self, submission_id):
+        """Статус из кэша без обращения к базе; None, если сабмишена нет в кэше"""
+        submission = self.cache.peek(submission_id)
+        return submission['status'] if submission is not None else None
+    
+    def list_by(self, column, value, limit, after=None, fields=DEFAULT_LISTING_FIELDS):
+        """
+        Страница сабмишенов с column = value в порядке создания, после
+        сабмишена after. Возвращает (страница, next_cursor); next_cursor = None
+        на последней странице. Запрос идет по индексу (column, created_at)
+        """
+        assert column in ('user_id', 'problem_id')
+        columns = ', '.join(FIELD_COLUMNS[field] for field in fields)
+        sql = f'SELECT {columns} FROM submissions WHERE {column} = ?'
+        params = [value]
+        if after is not None:
+            sql += ' AND (created_at, seq) > (?, ?)'
+            params += [after['created_at'], submission_seq(after['submission_id'])]
+        sql += ' ORDER BY created_at, seq LIMIT ?'
+        params.append(limit + 1)
+        with self._reader() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        next_cursor = page[-1]['submission_id'] if len(rows) > limit else None
+        return page, next_cursor
+    
+    def pending_ids(self):
+        """id сабмишенов без вердикта, по индексу status"""
+        with self._reader() as conn:
+            rows = conn.execute("SELECT 'sub_' || seq FROM submissions WHERE status = 'pending' ORDER BY created_at").fetchall()
+        return [row[0] for row in rows]
+    
+    def close(self):
+        self._writes.put(None)
+        self._writer.join()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Общее хранилище сабмишенов (создается лениво, при первом обращении)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SubmissionStore(SUBMISSION_DB_PATH)
+        return _store
+
+def parse_listing_args(args):
+    """limit, сабмишн из cursor и fields из query string. ValueError при ошибке"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit должен быть от 1 до {MAX_PAGE_SIZE}')
+    
+    cursor = args.get('cursor')
+    after = get_store().get(cursor) if cursor else None
+    if cursor and after is None:
+        raise ValueError(f'Некорректный cursor: {cursor}')
+    
+    fields = args.get('fields')
+    if not fields:
+        return limit, after, DEFAULT_LISTING_FIELDS
+    requested = [field for field in fields.split(',') if field]
+    unknown = set(requested) - set(SUBMISSION_FIELDS)
+    if unknown:
+        raise ValueError(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    # submission_id нужен клиенту всегда - по нему строится следующий cursor
+    return limit, after, tuple(dict.fromkeys(['submission_id'] + requested))
+
+class SubmissionWatchers:
+    """
+    Реестр ожидающих изменения сабмишена (long-poll и SSE). Условие создается
+    только пока его кто-то ждет, поэтому память не растет с числом сабмишенов.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiting = {}  # submission_id -> [Condition, число ожидающих]
+    
+    def wait_for(self, submission_id, predicate, timeout):
+        """Ждет, пока predicate() не станет истинным, но не дольше timeout. Возвращает predicate()"""
+        with self._lock:
+            entry = self._waiting.get(submission_id)
+            if entry is None:
+                entry = self._waiting[submission_id] = [threading.Condition(self._lock), 0]
+            entry[1] += 1
+            try:
+                return entry[0].wait_for(predicate, timeout)
+            finally:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._waiting[submission_id]
+    
+    def notify(self, submission_id):
+        """Будит всех, кто ждет сабмишн. Вызывать после изменения его полей"""
+        with self._lock:
+            entry = self._waiting.get(submission_id)
+            if entry is not None:
+                entry[0].notify_all()
+
+watchers = SubmissionWatchers()
+
+# Пул фоновой отправки на проверку: POST /submissions не ждет вердикта
+judge_executor = ThreadPoolExecutor(max_workers=JUDGE_DISPATCH_WORKERS, thread_name_prefix='judge-dispatch')
 
 def verify_token(token):
     try:
@@ -58,6 +425,60 @@ def verify_token(token):
     except:
         return None
 
+def judge_in_background(submission_id):
+    """
+    Отправка сабмишена в compiler_service и запись вердикта.
+    Выполняется в judge_executor; пока вердикта нет, статус остается pending.
+    """
+    submission = get_store().get(submission_id)
+    try:
+        compile_response = requests.post(
+            f'{COMPILER_SERVICE_URL}/compile',
+            json={
+                'submission_id': submission_id,
+                'code': submission['code'],
+                'language': submission['language'],
+                'problem_id': submission['problem_id']
+            },
+            timeout=JUDGE_REQUEST_TIMEOUT
+        )
+        try:
+            result = compile_response.json()
+        except ValueError:
+            result = {}
+        if compile_response.status_code == 200:
+            status = result.get('status', 'error')
+        else:
+            # Вердикт не получен (ошибка валидации или сбой компилятора) - сабмишн не должен висеть в pending
+            status = 'error'
+        message = result.get('result') or f'Compiler service вернул HTTP {compile_response.status_code}'
+    except Exception as e:
+        logger.exception('Ошибка проверки сабмишена %s', submission_id)
+        status, message = 'error', str(e)
+
+    get_store().update(submission_id, status=status, result=message, judged_at=datetime.now().isoformat())
+    watchers.notify(submission_id)
+
+def wait_for_verdict(submission_id, timeout):
+    """
+    Ждет вердикта не дольше timeout и возвращает сабмишн. Вердикт этого
+    процесса будит сразу через watchers, вердикт другой реплики замечается
+    при перечитывании базы раз в STORE_POLL_INTERVAL
+    """
+    deadline = time.monotonic() + timeout
+    submission = get_store().get(submission_id)
+    while submission['status'] == 'pending':
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        watchers.wait_for(
+            submission_id,
+            lambda: get_store().cached_status(submission_id) not in (None, 'pending'),
+            min(remaining, STORE_POLL_INTERVAL)
+        )
+        submission = get_store().get(submission_id)
+    return submission
+
 @app.route('/health', methods=['GET'])
 @swag_from({
     'tags': ['Health'],
@@ -86,7 +507,11 @@ def health():
             }
         }
     }],
-    'responses': {201: {'description': 'Сабмишн создан'}, 400: {'description': 'Ошибка валидации'}, 401: {'description': 'Неавторизован'}}
+    'responses': {
+        202: {'description': 'Сабмишн принят и поставлен на проверку. Статус - по адресу из заголовка Location'},
+        400: {'description': 'Ошибка валидации'},
+        401: {'description': 'Неавторизован'}
+    }
 })
 def create_submission():
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
@@ -102,40 +527,23 @@ def create_submission():
     if not problem_id or not code:
         return jsonify({'message': 'Необходимы problem_id и code'}), 400
     
-    submission_id = f"sub_{len(submissions) + 1}"
     submission = {
-        'submission_id': submission_id,
         'user_id': user_id,
         'problem_id': problem_id,
         'code': code,
         'language': language,
         'status': 'pending',
-        'result': None,
-        'created_at': datetime.now().isoformat()
+        'result': None
     }
+    submission_id = get_store().add(submission)
+    # Ответ собираем до отправки, чтобы он точно содержал pending
+    response = jsonify(submission)
+    judge_executor.submit(judge_in_background, submission_id)
     
-    submissions[submission_id] = submission
-    
-    # Отправляем на компиляцию
-    try:
-        compile_response = requests.post(
-            f'{COMPILER_SERVICE_URL}/compile',
-            json={
-                'submission_id': submission_id,
-                'code': code,
-                'language': language,
-                'problem_id': problem_id
-            }
-        )
-        if compile_response.status_code == 200:
-            result = compile_response.json()
-            submission['status'] = result.get('status', 'error')
-            submission['result'] = result.get('result')
-    except Exception as e:
-        submission['status'] = 'error'
-        submission['result'] = str(e)
-    
-    return jsonify(submission), 201
+    return response, 202, {
+        'Location': f'/submissions/{submission_id}',
+        'Retry-After': str(POLL_RETRY_AFTER)
+    }
 
 @app.route('/submissions/<submission_id>', methods=['GET'])
 @swag_from({
@@ -147,8 +555,14 @@ def create_submission():
         'in': 'path',
         'type': 'string',
         'required': True
+    }, {
+        'name': 'wait',
+        'in': 'query',
+        'type': 'integer',
+        'required': False,
+        'description': f'Long-poll: ждать вердикта до N секунд (не больше {MAX_POLL_WAIT})'
     }],
-    'responses': {200: {'description': 'Сабмишн найден'}, 401: {'description': 'Неавторизован'}, 403: {'description': 'Доступ запрещен'}, 404: {'description': 'Не найден'}}
+    'responses': {200: {'description': 'Сабмишн найден. Пока статус pending, ответ содержит Retry-After'}, 400: {'description': 'Некорректный wait'}, 401: {'description': 'Неавторизован'}, 403: {'description': 'Доступ запрещен'}, 404: {'description': 'Не найден'}}
 })
 def get_submission(submission_id):
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
@@ -156,15 +570,74 @@ def get_submission(submission_id):
     if not user_id:
         return jsonify({'message': 'Неавторизован'}), 401
     
-    if submission_id not in submissions:
+    submission = get_store().get(submission_id)
+    if submission is None:
         return jsonify({'message': 'Сабмишн не найден'}), 404
     
-    submission = submissions[submission_id]
     if submission['user_id'] != user_id:
         return jsonify({'message': 'Доступ запрещен'}), 403
     
+    try:
+        wait = int(request.args.get('wait', 0))
+    except ValueError:
+        wait = -1
+    if wait < 0:
+        return jsonify({'message': 'wait должен быть неотрицательным целым'}), 400
+    if wait and submission['status'] == 'pending':
+        submission = wait_for_verdict(submission_id, min(wait, MAX_POLL_WAIT))
+    
+    if submission['status'] == 'pending':
+        return jsonify(submission), 200, {'Retry-After': str(POLL_RETRY_AFTER)}
     return jsonify(submission), 200
 
+def submission_events(submission):
+    """
+    SSE-поток: текущее состояние сабмишена, затем вердикт. Пока проверка идет,
+    раз в SSE_KEEPALIVE_INTERVAL шлется комментарий, чтобы прокси не закрыли соединение
+    """
+    yield f'retry: {POLL_RETRY_AFTER * 1000}\n'
+    yield f"event: status\ndata: {json.dumps(submission, ensure_ascii=False)}\n\n"
+    while submission['status'] == 'pending':
+        submission = wait_for_verdict(submission['submission_id'], SSE_KEEPALIVE_INTERVAL)
+        if submission['status'] != 'pending':
+            yield f"event: status\ndata: {json.dumps(submission, ensure_ascii=False)}\n\n"
+        else:
+            yield ': keepalive\n\n'
+
+@app.route('/submissions/<submission_id>/events', methods=['GET'])
+@swag_from({
+    'tags': ['Submissions'],
+    'summary': 'Поток событий сабмишена (Server-Sent Events)',
+    'description': 'Событие status с текущим состоянием, затем с вердиктом; после вердикта поток закрывается',
+    'security': [{'Bearer': []}],
+    'produces': ['text/event-stream'],
+    'parameters': [{
+        'name': 'submission_id',
+        'in': 'path',
+        'type': 'string',
+        'required': True
+    }],
+    'responses': {200: {'description': 'Поток событий'}, 401: {'description': 'Неавторизован'}, 403: {'description': 'Доступ запрещен'}, 404: {'description': 'Не найден'}}
+})
+def get_submission_events(submission_id):
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    user_id = verify_token(token)
+    if not user_id:
+        return jsonify({'message': 'Неавторизован'}), 401
+    
+    submission = get_store().get(submission_id)
+    if submission is None:
+        return jsonify({'message': 'Сабмишн не найден'}), 404
+    
+    if submission['user_id'] != user_id:
+        return jsonify({'message': 'Доступ запрещен'}), 403
+    
+    return Response(
+        stream_with_context(submission_events(submission)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/submissions/user/<user_id>', methods=['GET'])
 @swag_from({
     'tags': ['Submissions'],
@@ -175,8 +648,26 @@ def get_submission(submission_id):
         'in': 'path',
         'type': 'string',
         'required': True
+    }, {
+        'name': 'limit',
+        'in': 'query',
+        'type': 'integer',
+        'required': False,
+        'description': f'Размер страницы, по умолчанию {DEFAULT_PAGE_SIZE}, не больше {MAX_PAGE_SIZE}'
+    }, {
+        'name': 'cursor',
+        'in': 'query',
+        'type': 'string',
+        'required': False,
+        'description': 'next_cursor из предыдущей страницы'
+    }, {
+        'name': 'fields',
+        'in': 'query',
+        'type': 'string',
+        'required': False,
+        'description': 'Поля через запятую; по умолчанию все, кроме code'
     }],
-    'responses': {200: {'description': 'Список сабмишенов'}, 401: {'description': 'Неавторизован'}, 403: {'description': 'Доступ запрещен'}}
+    'responses': {200: {'description': 'Страница сабмишенов и next_cursor'}, 400: {'description': 'Некорректные limit, cursor или fields'}, 401: {'description': 'Неавторизован'}, 403: {'description': 'Доступ запрещен'}}
 })
 def get_user_submissions(user_id):
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
@@ -187,8 +678,13 @@ def get_user_submissions(user_id):
     if current_user != user_id:
         return jsonify({'message': 'Доступ запрещен'}), 403
     
-    user_submissions = [s for s in submissions.values() if s['user_id'] == user_id]
-    return jsonify({'submissions': user_submissions}), 200
+    try:
+        limit, after, fields = parse_listing_args(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    user_submissions, next_cursor = get_store().list_by('user_id', user_id, limit, after, fields)
+    return jsonify({'submissions': user_submissions, 'next_cursor': next_cursor}), 200
 
 @app.route('/submissions/problem/<problem_id>', methods=['GET'])
 @swag_from({
@@ -200,8 +696,26 @@ def get_user_submissions(user_id):
         'in': 'path',
         'type': 'string',
         'required': True
+    }, {
+        'name': 'limit',
+        'in': 'query',
+        'type': 'integer',
+        'required': False,
+        'description': f'Размер страницы, по умолчанию {DEFAULT_PAGE_SIZE}, не больше {MAX_PAGE_SIZE}'
+    }, {
+        'name': 'cursor',
+        'in': 'query',
+        'type': 'string',
+        'required': False,
+        'description': 'next_cursor из предыдущей страницы'
+    }, {
+        'name': 'fields',
+        'in': 'query',
+        'type': 'string',
+        'required': False,
+        'description': 'Поля через запятую; по умолчанию все, кроме code'
     }],
-    'responses': {200: {'description': 'Список сабмишенов'}, 401: {'description': 'Неавторизован'}}
+    'responses': {200: {'description': 'Страница сабмишенов и next_cursor'}, 400: {'description': 'Некорректные limit, cursor или fields'}, 401: {'description': 'Неавторизован'}}
 })
 def get_problem_submissions(problem_id):
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
@@ -209,8 +723,26 @@ def get_problem_submissions(problem_id):
     if not user_id:
         return jsonify({'message': 'Неавторизован'}), 401
     
-    problem_submissions = [s for s in submissions.values() if s['problem_id'] == problem_id]
-    return jsonify({'submissions': problem_submissions}), 200
+    try:
+        limit, after, fields = parse_listing_args(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    problem_submissions, next_cursor = get_store().list_by('problem_id', problem_id, limit, after, fields)
+    return jsonify({'submissions': problem_submissions, 'next_cursor': next_cursor}), 200
+
+def resend_pending_submissions():
+    """
+    Проверки, прерванные остановкой сервиса, запускаем заново. При нескольких
+    репликах сабмишн может быть проверен дважды - вердикт от этого не меняется.
+    """
+    for submission_id in get_store().pending_ids():
+        judge_executor.submit(judge_in_background, submission_id)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5004, debug=True)
+    app.debug = True
+    # В debug-режиме reloader запускает сервер в дочернем процессе с
+    # WERKZEUG_RUN_MAIN=true, а родитель только следит за файлами
+    if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resend_pending_submissions()
+    app.run(host='0.0.0.0', port=5004, debug=app.debug)
@@ -56,10 +56,30 @@ def test_create_submission(wait_for_services, auth_token):
             'language': 'python'
         }
     )
-    assert response.status_code == 201
+    assert response.status_code == 202
     data = response.json()
     assert 'submission_id' in data
     assert data['problem_id'] == 'problem_1'
     assert data['language'] == 'python'
+    assert data['status'] == 'pending'
+    assert response.headers['Location'] == f"/submissions/{data['submission_id']}"
+
+def test_submission_is_judged_in_background(wait_for_services, auth_token):
+    """E2E тест: вердикт появляется по адресу из Location"""
+    headers = {'Authorization': f'Bearer {auth_token}'}
+    response = requests.post(
+        f'{BASE_URL}/submissions',
+        headers=headers,
+        json={'problem_id': 'problem_1', 'code': 'print("Hello, World!")', 'language': 'python'}
+    )
+    location = response.headers['Location']
+
+    for _ in range(30):
+        status_response = requests.get(f'{BASE_URL}{location}', headers=headers)
+        assert status_response.status_code == 200
+        if status_response.json()['status'] != 'pending':
+            break
+        time.sleep(int(status_response.headers.get('Retry-After', 1)))
+    assert status_response.json()['status'] != 'pending'
 
 
@@ -0,0 +1,288 @@
+import json
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+from app import app, SubmissionStore, watchers, judge_in_background, wait_for_verdict, resend_pending_submissions
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Отдельная база сабмишенов на каждый тест"""
+    store = SubmissionStore(str(tmp_path / 'submissions.db'))
+    monkeypatch.setattr('app._store', store)
+    yield store
+    store.close()
+
+@pytest.fixture
+def client(store):
+    """Создает тестовый клиент Flask"""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        with app.app_context():
+            yield client
+
+@pytest.fixture
+def mock_auth_verify():
+    """Мок для verify_token"""
+    with patch('app.verify_token') as mock:
+        mock.return_value = 'user_1'
+        yield mock
+
+@pytest.fixture
+def mock_dispatch():
+    """Мок фонового пула: проверка не запускается, пока тест не вызовет ее сам"""
+    with patch('app.judge_executor') as mock:
+        yield mock
+
+def compiler_response(status_code, payload):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = payload
+    return response
+
+def create(client, **payload):
+    payload.setdefault('problem_id', 'problem_1')
+    payload.setdefault('code', 'print(1)')
+    return client.post('/submissions', json=payload, headers={'Authorization': 'Bearer token'})
+
+def test_create_submission_returns_202_without_waiting(client, mock_auth_verify, mock_dispatch):
+    """POST /submissions сразу отвечает 202 и ставит проверку в пул"""
+    with patch('app.requests.post') as compile_post:
+        response = create(client)
+
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data['status'] == 'pending'
+    assert response.headers['Location'] == f"/submissions/{data['submission_id']}"
+    assert response.headers['Retry-After'] == '1'
+    compile_post.assert_not_called()
+    mock_dispatch.submit.assert_called_once_with(judge_in_background, data['submission_id'])
+
+def test_create_submission_requires_code(client, store, mock_auth_verify, mock_dispatch):
+    """Без кода сабмишн не создается и не отправляется на проверку"""
+    response = create(client, code='')
+    assert response.status_code == 400
+    assert store.pending_ids() == []
+    mock_dispatch.submit.assert_not_called()
+
+def test_judge_in_background_records_verdict(client, store, mock_auth_verify, mock_dispatch):
+    """Вердикт compiler_service записывается в сабмишн"""
+    submission_id = create(client).get_json()['submission_id']
+
+    with patch('app.requests.post', return_value=compiler_response(200, {'status': 'accepted', 'result': 'OK'})) as compile_post:
+        judge_in_background(submission_id)
+
+    assert compile_post.call_args.kwargs['json']['code'] == 'print(1)'
+    assert store.get(submission_id)['status'] == 'accepted'
+    assert store.get(submission_id)['result'] == 'OK'
+    assert store.get(submission_id)['judged_at'] is not None
+
+def test_judge_in_background_marks_errors(client, store, mock_auth_verify, mock_dispatch):
+    """Отказ или недоступность compiler_service не оставляют сабмишн в pending"""
+    first = create(client).get_json()['submission_id']
+    second = create(client).get_json()['submission_id']
+
+    rejected = compiler_response(400, {'status': 'error', 'result': 'Неподдерживаемый язык: cobol'})
+    with patch('app.requests.post', return_value=rejected):
+        judge_in_background(first)
+    with patch('app.requests.post', side_effect=ConnectionError('refused')):
+        judge_in_background(second)
+
+    assert store.get(first)['status'] == 'error'
+    assert store.get(first)['result'] == 'Неподдерживаемый язык: cobol'
+    assert store.get(second)['status'] == 'error'
+    assert store.get(second)['result'] == 'refused'
+
+def test_get_submission_retry_after_only_while_pending(client, store, mock_auth_verify, mock_dispatch):
+    """Пока вердикта нет, GET подсказывает интервал опроса"""
+    submission_id = create(client).get_json()['submission_id']
+    headers = {'Authorization': 'Bearer token'}
+
+    response = client.get(f'/submissions/{submission_id}', headers=headers)
+    assert response.status_code == 200
+    assert response.headers['Retry-After'] == '1'
+
+    store.update(submission_id, status='accepted')
+    response = client.get(f'/submissions/{submission_id}', headers=headers)
+    assert 'Retry-After' not in response.headers
+
+def finish_later(store, submission_id, status, delay=0.1):
+    """Имитация вердикта, пришедшего из фонового пула"""
+    def finish():
+        store.update(submission_id, status=status)
+        watchers.notify(submission_id)
+    timer = threading.Timer(delay, finish)
+    timer.start()
+    return timer
+
+def test_long_poll_returns_as_soon_as_verdict_arrives(client, store, mock_auth_verify, mock_dispatch, monkeypatch):
+    """?wait=N отвечает сразу после вердикта, не дожидаясь таймаута"""
+    # Перечитывание базы отключено: ответ должен прийти по уведомлению
+    monkeypatch.setattr('app.STORE_POLL_INTERVAL', 30)
+    submission_id = create(client).get_json()['submission_id']
+    finish_later(store, submission_id, 'accepted')
+
+    started = time.monotonic()
+    response = client.get(f'/submissions/{submission_id}?wait=10', headers={'Authorization': 'Bearer token'})
+
+    assert time.monotonic() - started < 5
+    assert response.get_json()['status'] == 'accepted'
+    assert 'Retry-After' not in response.headers
+    assert mock_auth_verify.call_count == 2
+
+def test_long_poll_times_out_pending(client, mock_auth_verify, mock_dispatch, monkeypatch):
+    """По таймауту long-poll возвращает pending; ожидание ограничено MAX_POLL_WAIT"""
+    monkeypatch.setattr('app.MAX_POLL_WAIT', 0.1)
+    submission_id = create(client).get_json()['submission_id']
+
+    response = client.get(f'/submissions/{submission_id}?wait=30', headers={'Authorization': 'Bearer token'})
+    assert response.get_json()['status'] == 'pending'
+    assert response.headers['Retry-After'] == '1'
+    assert client.get(f'/submissions/{submission_id}?wait=soon', headers={'Authorization': 'Bearer token'}).status_code == 400
+
+def test_events_stream_ends_with_verdict(client, store, mock_auth_verify, mock_dispatch, monkeypatch):
+    """SSE: текущее состояние, keepalive, вердикт и закрытие потока"""
+    monkeypatch.setattr('app.SSE_KEEPALIVE_INTERVAL', 0.05)
+    submission_id = create(client).get_json()['submission_id']
+    finish_later(store, submission_id, 'accepted', delay=0.2)
+
+    response = client.get(f'/submissions/{submission_id}/events', headers={'Authorization': 'Bearer token'})
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+
+    events = [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+    assert [event['status'] for event in events] == ['pending', 'accepted']
+    assert ': keepalive' in body
+
+def test_events_require_owner(client, mock_auth_verify, mock_dispatch):
+    """Поток событий доступен только автору сабмишена"""
+    submission_id = create(client).get_json()['submission_id']
+    mock_auth_verify.return_value = 'user_2'
+    response = client.get(f'/submissions/{submission_id}/events', headers={'Authorization': 'Bearer token'})
+    assert response.status_code == 403
+
+def test_listings_use_indexes_in_creation_order(client, store, mock_auth_verify, mock_dispatch):
+    """Списки по пользователю и задаче берутся из индексов в порядке создания"""
+    headers = {'Authorization': 'Bearer token'}
+    first = create(client, problem_id='a').get_json()['submission_id']
+    second = create(client, problem_id='b').get_json()['submission_id']
+    mock_auth_verify.return_value = 'user_2'
+    third = create(client, problem_id='a').get_json()['submission_id']
+
+    response = client.get('/submissions/problem/a', headers=headers)
+    assert [s['submission_id'] for s in response.get_json()['submissions']] == [first, third]
+
+    mock_auth_verify.return_value = 'user_1'
+    response = client.get('/submissions/user/user_1', headers=headers)
+    assert [s['submission_id'] for s in response.get_json()['submissions']] == [first, second]
+
+    # Статус в списке актуален после обновления
+    store.update(first, status='accepted')
+    response = client.get('/submissions/problem/a', headers=headers)
+    assert response.get_json()['submissions'][0]['status'] == 'accepted'
+    assert client.get('/submissions/problem/missing', headers=headers).get_json() == {'submissions': [], 'next_cursor': None}
+
+def test_listing_pages_with_cursor(client, mock_auth_verify, mock_dispatch):
+    """limit и cursor проходят весь список без пропусков и повторов"""
+    headers = {'Authorization': 'Bearer token'}
+    created = [create(client).get_json()['submission_id'] for _ in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        url = '/submissions/problem/problem_1?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url, headers=headers).get_json()
+        assert len(data['submissions']) <= 2
+        seen += [s['submission_id'] for s in data['submissions']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == created
+
+def test_listing_leaves_out_code_by_default(client, mock_auth_verify, mock_dispatch):
+    """Без fields код не отдается; fields выбирает поля, submission_id есть всегда"""
+    headers = {'Authorization': 'Bearer token'}
+    create(client)
+
+    item = client.get('/submissions/user/user_1', headers=headers).get_json()['submissions'][0]
+    assert 'code' not in item
+    assert item['status'] == 'pending'
+
+    item = client.get('/submissions/user/user_1?fields=code,status', headers=headers).get_json()['submissions'][0]
+    assert set(item) == {'submission_id', 'code', 'status'}
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=1000', 'limit=many', 'cursor=abc', 'fields=code,secret'])
+def test_listing_rejects_bad_arguments(client, mock_auth_verify, mock_dispatch, query):
+    """Некорректные limit, cursor или fields - 400"""
+    response = client.get(f'/submissions/problem/problem_1?{query}', headers={'Authorization': 'Bearer token'})
+    assert response.status_code == 400
+
+def test_store_survives_reopen(tmp_path):
+    """Сабмишены и счетчик id переживают перезапуск"""
+    path = str(tmp_path / 'submissions.db')
+    store = SubmissionStore(path)
+    submission_id = store.add({'user_id': 'u', 'problem_id': 'p', 'code': 'x', 'language': 'python', 'status': 'pending', 'result': None})
+    store.update(submission_id, status='accepted', result='OK')
+    store.close()
+
+    reopened = SubmissionStore(path)
+    try:
+        assert reopened.get(submission_id)['status'] == 'accepted'
+        assert reopened.pending_ids() == []
+        next_id = reopened.add({'user_id': 'u', 'problem_id': 'p', 'code': 'y', 'language': 'python', 'status': 'pending', 'result': None})
+        assert next_id != submission_id
+        assert reopened.pending_ids() == [next_id]
+    finally:
+        reopened.close()
+
+def test_resend_pending_submissions(store, mock_dispatch):
+    """После перезапуска на проверку заново уходят только сабмишены без вердикта"""
+    pending = store.add({'user_id': 'u', 'problem_id': 'p', 'code': 'x', 'language': 'python', 'status': 'pending', 'result': None})
+    store.add({'user_id': 'u', 'problem_id': 'p', 'code': 'y', 'language': 'python', 'status': 'accepted', 'result': 'OK'})
+
+    resend_pending_submissions()
+
+    mock_dispatch.submit.assert_called_once_with(judge_in_background, pending)
+
+def test_store_groups_concurrent_writes(store):
+    """Одновременные вставки фиксируются пакетами и получают разные id"""
+    commits = []
+    original_commit = store._commit
+    def counting_commit(conn, batch):
+        commits.append(len(batch))
+        time.sleep(0.005)
+        original_commit(conn, batch)
+    store._commit = counting_commit
+
+    def add(i):
+        return store.add({'user_id': f'u{i % 3}', 'problem_id': 'p', 'code': 'x', 'language': 'python', 'status': 'pending', 'result': None})
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        ids = list(pool.map(add, range(64)))
+
+    assert len(set(ids)) == 64
+    assert sum(commits) == 64
+    assert len(commits) < 64
+    page, _ = store.list_by('problem_id', 'p', limit=100)
+    assert len(page) == 64
+
+def test_verdict_from_another_replica(tmp_path, monkeypatch):
+    """Реплики на одном файле не делят id, а вердикт чужой реплики виден ожидающему"""
+    path = str(tmp_path / 'submissions.db')
+    owner, other = SubmissionStore(path), SubmissionStore(path)
+    try:
+        first = owner.add({'user_id': 'u', 'problem_id': 'p', 'code': 'x', 'language': 'python', 'status': 'pending', 'result': None})
+        second = other.add({'user_id': 'u', 'problem_id': 'p', 'code': 'x', 'language': 'python', 'status': 'pending', 'result': None})
+        assert first != second
+
+        # pending чужой реплики не кэшируется, иначе вердикт никогда не будет замечен
+        assert other.get(first)['status'] == 'pending'
+        assert other.cached_status(first) is None
+
+        monkeypatch.setattr('app._store', other)
+        monkeypatch.setattr('app.STORE_POLL_INTERVAL', 0.05)
+        threading.Timer(0.1, lambda: owner.update(first, status='accepted')).start()
+        assert wait_for_verdict(first, 5)['status'] == 'accepted'
+    finally:
+        owner.close()
+        other.close()